@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from collections.abc import Callable
+
 from intent.schema import ToolName
 
 # Aliases from chloe-dev music_service.py
@@ -26,6 +28,9 @@ INSTRUMENT_ALIASES: dict[str, str] = {
     "ride_cymbal": "ride",
 }
 
+# Separators allowed between chord degrees ("1-4-5", "1,4,5"), mapped to spaces
+_PROGRESSION_SEPARATORS = str.maketrans("-,", "  ")
+
 
 def normalize_params(tool: ToolName, params: dict) -> dict:
     """Normalize LLM-produced params into canonical form per tool.
@@ -33,17 +38,10 @@ def normalize_params(tool: ToolName, params: dict) -> dict:
     Returns a new dict with normalized values, or the original if no tool-specific
     normalization applies.
     """
-    if tool == ToolName.pitch_shift:
-        return _normalize_pitch_shift(params)
-    if tool == ToolName.repeat_track:
-        return _normalize_repeat_track(params)
-    if tool == ToolName.switch_instrument:
-        return _normalize_switch_instrument(params)
-    if tool == ToolName.mp3_to_midi:
-        return _normalize_mp3_to_midi(params)
-    if tool == ToolName.progression_change:
-        return _normalize_progression_change(params)
-    return params
+    normalizer = _NORMALIZERS.get(tool)
+    if normalizer is None:
+        return params
+    return normalizer(params)
 
 
 def _normalize_pitch_shift(params: dict) -> dict:
@@ -113,16 +111,26 @@ def _normalize_progression_change(params: dict) -> dict:
     result = dict(params)
     prog = result.get("progression")
     if isinstance(prog, str):
-        parts = prog.replace("-", " ").replace(",", " ").split()
+        parts = prog.translate(_PROGRESSION_SEPARATORS).split()
         # If all parts are numeric, treat as chord degree list
-        if all(p.isdigit() for p in parts if p.strip()):
-            result["progression"] = [_to_int(p) for p in parts if p.strip()]
+        if all(p.isdigit() for p in parts):
+            result["progression"] = [_to_int(p) for p in parts]
         # Otherwise keep as-is (scale name like "A minor", "D major")
     elif isinstance(prog, list):
         result["progression"] = [_to_int(p) for p in prog]
     return result
 
 
+# Per-tool normalizers, looked up by normalize_params
+_NORMALIZERS: dict[ToolName, Callable[[dict], dict]] = {
+    ToolName.pitch_shift: _normalize_pitch_shift,
+    ToolName.repeat_track: _normalize_repeat_track,
+    ToolName.switch_instrument: _normalize_switch_instrument,
+    ToolName.mp3_to_midi: _normalize_mp3_to_midi,
+    ToolName.progression_change: _normalize_progression_change,
+}
+
+
 def validate_required_params(tool: ToolName, params: dict) -> str | None:
     """Check that required params are present for the tool.
 
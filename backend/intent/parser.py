@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 import os
 
 from models import Segment, SegmentType
@@ -8,6 +9,8 @@ from pydantic import ValidationError
 from intent.prompts import TOOL_PICKER_PROMPT, build_available_tracks_section
 from intent.schema import ToolPickerOutput
 
+logger = logging.getLogger(__name__)
+
 MODEL = "gemini-2.0-flash"
 
 MUSICAL_TYPES = {SegmentType.singing, SegmentType.humming, SegmentType.beatboxing}
@@ -78,7 +81,7 @@ def pick_tools(
         f"Now output the tool_calls JSON."
     )
 
-    print(f"{tag} Calling Gemini with full instruction doc ({len(instruction_doc)} chars)...")
+    logger.info(f"{tag} Calling Gemini with full instruction doc ({len(instruction_doc)} chars)...")
 
     client = _get_client()
     response = client.models.generate_content(
@@ -90,12 +93,12 @@ def pick_tools(
         },
     )
 
-    print(f"{tag} Raw response: {response.text[:300]}")
+    logger.info(f"{tag} Raw response: {response.text[:300]}")
 
     try:
         result = ToolPickerOutput.model_validate_json(response.text)
-        print(f"{tag} Parsed {len(result.tool_calls)} tool call(s)")
+        logger.info(f"{tag} Parsed {len(result.tool_calls)} tool call(s)")
         return result
     except ValidationError as e:
-        print(f"{tag} Validation failed: {e}")
+        logger.warning(f"{tag} Validation failed: {e}")
         return ToolPickerOutput(tool_calls=[])
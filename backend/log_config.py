@@ -0,0 +1,22 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+def setup_logging(level: int = logging.INFO) -> QueueListener:
+    """Route backend logging through a queue drained by a background thread.
+
+    Pipeline threads and request handlers only enqueue records, so writing to
+    a slow or contended stdout never blocks them. Returns the started listener
+    so the caller can stop (and flush) it on shutdown.
+    """
+    log_queue: queue.Queue = queue.Queue(-1)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+    listener.start()
+    return listener
@@ -1,17 +1,27 @@
+import logging
 import os
 import time
 
 from dotenv import load_dotenv
 load_dotenv()
 
+from log_config import setup_logging
+_log_listener = setup_logging()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from routers.upload import router as upload_router, _executor
+from paths import JOBS_DIR, SAVED_TRACKS_DIR
+from routers.upload import router as upload_router, _executor, UploadSizeLimitMiddleware
 from routers.tracks import router as tracks_router
+from pipeline.orchestrator import shutdown_score_pool
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+# Added before CORS so that CORS wraps it and 413 responses carry its headers
+app.add_middleware(UploadSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -24,10 +34,10 @@ app.add_middleware(
 @app.middleware("http")
 async def log_requests(request, call_next):
     start = time.time()
-    print(f"[api] {request.method} {request.url.path} started")
+    logger.info(f"[api] {request.method} {request.url.path} started")
     response = await call_next(request)
     elapsed = time.time() - start
-    print(f"[api] {request.method} {request.url.path} completed — {response.status_code} ({elapsed:.2f}s)")
+    logger.info(f"[api] {request.method} {request.url.path} completed — {response.status_code} ({elapsed:.2f}s)")
     return response
 
 
@@ -37,14 +47,16 @@ app.include_router(tracks_router)
 
 @app.on_event("startup")
 def startup():
-    os.makedirs("/tmp/audio_midi_jobs", exist_ok=True)
-    os.makedirs(os.path.join(os.path.dirname(os.path.abspath(__file__)), "saved_tracks"), exist_ok=True)
-    print("[startup] Server ready to accept requests")
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    os.makedirs(SAVED_TRACKS_DIR, exist_ok=True)
+    logger.info("[startup] Server ready to accept requests")
 
 
 @app.on_event("shutdown")
 def shutdown():
     _executor.shutdown(wait=False, cancel_futures=True)
+    shutdown_score_pool()
+    _log_listener.stop()
 
 
 @app.get("/api/health")
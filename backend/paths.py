@@ -0,0 +1,29 @@
+"""Filesystem locations shared across the backend, resolved once at import."""
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# User-facing MIDI tracks the tools edit in place
+SAVED_TRACKS_DIR = os.path.join(BACKEND_DIR, "saved_tracks")
+# Final merged MIDI per job, kept after the job directory is gone
+MIDI_OUTPUTS_DIR = os.path.join(BACKEND_DIR, "midi-outputs")
+# Rendered per-type MIDIs reused across jobs by the score builder
+MIDI_CACHE_DIR = os.getenv("MIDI_CACHE_DIR") or os.path.join(MIDI_OUTPUTS_DIR, ".cache")
+# Opt-in debug dumps (DEBUG_DUMPS=1)
+LOG_DIR = os.path.join(BACKEND_DIR, "log_files")
+
+# Per-job working directories (uploads, clips, intermediate MIDIs)
+JOBS_DIR = os.path.join("/tmp", "audio_midi_jobs")
+
+
+def list_midi_files(directory: str) -> list[str]:
+    """Sorted names of the .mid files in directory, skipping hidden ones ([] if it is missing)."""
+    try:
+        with os.scandir(directory) as entries:
+            return sorted(
+                entry.name for entry in entries
+                if entry.name.endswith(".mid") and not entry.name.startswith(".")
+                and entry.is_file()
+            )
+    except FileNotFoundError:
+        return []
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+import time
+
+from models import JobStatus
+
+# Jobs in these states are never evicted, however long they run
+ACTIVE_STATUSES = {"pending", "processing"}
+
+# Opt-in eviction of finished jobs; unset keeps every job, since the editor
+# goes on using a job (edits, MIDI downloads) long after it stops polling
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS") or 0) or None
+
+# Optional SQLite file shared by every server worker; unset keeps jobs in memory only
+JOB_DB_PATH = os.getenv("JOB_DB_PATH") or None
+
+
+class JobStore:
+    """Thread-safe registry of JobStatus objects.
+
+    Pipelines run on executor threads while the API reads from the event loop,
+    so every access goes through a lock. With ``ttl`` set, finished jobs that
+    nobody has polled for ``ttl`` seconds are dropped, bounding memory on
+    long-running servers; by default jobs are kept for the server's lifetime.
+
+    With ``db_path`` set, jobs are also written to a SQLite database (WAL
+    mode) so that any worker of a multi-process server can answer status
+    polls. The worker running a job keeps the live object in memory and
+    publishes it with :meth:`save` as the job progresses. Every read checks
+    the database, and a row saved more recently by another worker replaces
+    the local copy. Reads also refresh the row's ``touched`` time, so the
+    TTL counts from the last poll on any worker, as it does in memory.
+    """
+
+    def __init__(self, ttl: float | None = JOB_TTL_SECONDS, db_path: str | None = None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs: dict[str, JobStatus] = {}
+        self._touched: dict[str, float] = {}
+        # Wall-clock time of the DB row each in-memory job corresponds to
+        self._saved_at: dict[str, float] = {}
+        self._db: sqlite3.Connection | None = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, json TEXT NOT NULL, "
+                "updated REAL NOT NULL, touched REAL NOT NULL)"
+            )
+            # Databases created before reads were tracked lack the touched column
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            if "touched" not in columns:
+                self._db.execute("ALTER TABLE jobs ADD COLUMN touched REAL NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE jobs SET touched = updated")
+
+    def __setitem__(self, job_id: str, job: JobStatus) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            self._jobs[job_id] = job
+            self._touched[job_id] = now
+            self._write(job_id, job)
+
+    def __getitem__(self, job_id: str) -> JobStatus:
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    def get(self, job_id: str, default: JobStatus | None = None) -> JobStatus | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if self._db is not None:
+                job = self._refresh_from_db(job_id, job)
+            if job is None:
+                return default
+            self._touched[job_id] = time.monotonic()
+            return job
+
+    def save(self, job: JobStatus) -> None:
+        """Publish the current state of a job mutated in place."""
+        with self._lock:
+            self._jobs[job.id] = job
+            self._touched[job.id] = time.monotonic()
+            self._write(job.id, job)
+
+    def _refresh_from_db(self, job_id: str, job: JobStatus | None) -> JobStatus | None:
+        """Return the newest copy of a job, local or saved by another worker. Caller holds the lock."""
+        row = self._db.execute("SELECT json, updated FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            # Expired (or never published): only a live local job survives
+            return job
+        self._db.execute("UPDATE jobs SET touched = ? WHERE id = ?", (time.time(), job_id))
+        data, updated = row
+        if job is not None and self._saved_at.get(job_id, 0.0) >= updated:
+            return job
+        job = JobStatus.model_validate_json(data)
+        self._jobs[job_id] = job
+        self._saved_at[job_id] = updated
+        return job
+
+    def _write(self, job_id: str, job: JobStatus) -> None:
+        """Upsert a job into the database, if there is one. Caller holds the lock."""
+        if self._db is None:
+            return
+        now = time.time()
+        self._db.execute(
+            "INSERT INTO jobs (id, status, json, updated, touched) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET "
+            "status = excluded.status, json = excluded.json, "
+            "updated = excluded.updated, touched = excluded.touched",
+            (job_id, job.status, job.model_dump_json(), now, now),
+        )
+        self._saved_at[job_id] = now
+
+    def _evict_expired(self, now: float) -> None:
+        """Drop finished jobs idle for longer than the TTL. Caller holds the lock."""
+        if self._ttl is None:
+            return
+        expired = [
+            job_id for job_id, touched in self._touched.items()
+            if now - touched > self._ttl
+            and self._jobs[job_id].status not in ACTIVE_STATUSES
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            del self._touched[job_id]
+            self._saved_at.pop(job_id, None)
+
+        if self._db is not None:
+            placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+            self._db.execute(
+                f"DELETE FROM jobs WHERE touched < ? AND status NOT IN ({placeholders})",
+                (time.time() - self._ttl, *ACTIVE_STATUSES),
+            )
@@ -1,26 +1,150 @@
+import logging
+import multiprocessing
 import os
 import shutil
 import subprocess
+import threading
 import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-from models import JobStatus
+from models import GeminiAnalysis, JobStatus
+from paths import MIDI_OUTPUTS_DIR, SAVED_TRACKS_DIR
+from pipeline.job_store import JOB_DB_PATH, JobStore
 from pipeline.stage_gemini import run_gemini_stage
 from pipeline.stage_transcribe import run_transcribe_stage
 from pipeline.stage_intent import run_intent_stage
-from pipeline.stage_score_builder import run_score_builder_stage
+from pipeline.stage_score_builder import init_score_worker, run_score_builder_stage
 from pipeline.stage_instrument_mapper import run_instrument_mapper_stage
 from pipeline.stage_midi_merger import run_midi_merger_stage
 from intent.schema import ToolCall
-from tools.dispatch import dispatch_tool_call
+from tools.dispatch import MidiSession, dispatch_tool_call
+
+logger = logging.getLogger(__name__)
+
+# Job store (thread-safe, evicts finished jobs after a TTL, optionally backed
+# by SQLite so every server worker sees every job). Pipelines mutate their job
+# in place and publish each step with jobs.save(job).
+jobs = JobStore(db_path=JOB_DB_PATH)
+
+# MusicLang rendering is pure-Python CPU work, so each segment type's score
+# renders in a worker process, in parallel and without holding the API
+# process's GIL. Job state stays in this process.
+SCORE_BUILDER_PROCESSES = int(os.getenv("SCORE_BUILDER_PROCESSES", "2"))
+
+_score_pool: ProcessPoolExecutor | None = None
+_score_pool_lock = threading.Lock()
+
+
+def _get_score_pool() -> ProcessPoolExecutor:
+    """Return the shared score-builder process pool, starting it on first use.
+
+    Workers are spawned rather than forked: the server process is threaded
+    and forking it could copy held locks into the child.
+    """
+    global _score_pool
+    with _score_pool_lock:
+        if _score_pool is None:
+            _score_pool = ProcessPoolExecutor(
+                max_workers=SCORE_BUILDER_PROCESSES,
+                # Spawned workers import only what init_score_worker and the
+                # render function need, never this module
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_score_worker,
+            )
+        return _score_pool
+
+
+def shutdown_score_pool() -> None:
+    """Stop the score-builder processes (called on server shutdown)."""
+    global _score_pool
+    with _score_pool_lock:
+        if _score_pool is not None:
+            _score_pool.shutdown(wait=False, cancel_futures=True)
+            _score_pool = None
+
 
-# In-memory job store
-jobs: dict[str, JobStatus] = {}
+def _discard_score_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next _get_score_pool() starts a fresh one."""
+    global _score_pool
+    with _score_pool_lock:
+        if _score_pool is pool:
+            _score_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _build_scores(analysis: GeminiAnalysis, job_dir: str) -> dict[str, str]:
+    """Run the score builder on the shared pool, restarting the pool once if it broke.
+
+    A worker that dies (OOM, a crash in a native dependency) breaks the whole
+    ProcessPoolExecutor; without a restart every later job would fail here.
+    """
+    pool = _get_score_pool()
+    try:
+        return run_score_builder_stage(analysis, job_dir, executor=pool)
+    except BrokenProcessPool as exc:
+        logger.warning(f"[pipeline] Score-builder pool broke, restarting it ({exc})")
+        _discard_score_pool(pool)
+    return run_score_builder_stage(analysis, job_dir, executor=_get_score_pool())
+
+
+def _convert_to_mp3(audio_path: str) -> str:
+    """Convert an uploaded recording to MP3 next to it and return the new path.
+
+    ffmpeg is told to log errors only, so nothing is buffered on success and a
+    failure still carries its (short) stderr on the CalledProcessError.
+    """
+    mp3_path = audio_path.rsplit(".", 1)[0] + ".mp3"
+    subprocess.run(
+        ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", audio_path, mp3_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True,
+    )
+    return mp3_path
+
+
+def _remove_intermediates(job: JobStatus, job_dir: str, upload_path: str) -> int:
+    """Delete derived audio (converted MP3s, segment clips) once the job is done.
+
+    Every .mid is kept since the edit pipeline dispatches tools against them,
+    as are the original upload and any clip a tool call in the action log
+    takes as input. References to deleted clips are removed from the job's
+    segments and instruction doc. Returns the number of files removed.
+    """
+    keep = {upload_path}
+    for action in job.action_log:
+        segment_ref = action.get("audio_segment")
+        if segment_ref and segment_ref.get("path"):
+            keep.add(segment_ref["path"])
+
+    removed = set()
+    for entry in os.scandir(job_dir):
+        if entry.is_file() and not entry.name.endswith(".mid") and entry.path not in keep:
+            os.remove(entry.path)
+            removed.add(entry.path)
+
+    for seg in job.segments:
+        if seg.audio_clip_path in removed:
+            seg.audio_clip_path = None
+    if job.instruction_doc:
+        for path in removed:
+            job.instruction_doc = job.instruction_doc.replace(f" [file: {path}]", "")
+    return len(removed)
+
+
+def _parse_instructions(
+    analysis: GeminiAnalysis, upload_path: str, job_id: str, job_dir: str
+) -> tuple[str, list[dict]]:
+    """Transcribe speech segments and turn them into tool calls (stages 1.5 + 1.75)."""
+    instruction_doc = run_transcribe_stage(analysis, upload_path, job_id)
+    action_log = run_intent_stage(instruction_doc, analysis, job_id, job_dir)
+    return instruction_doc, action_log
 
 
 def run_pipeline(job_id: str, audio_path: str) -> None:
     """Run the full audio-to-MIDI pipeline and update job state."""
     job = jobs[job_id]
     job.status = "processing"
+    jobs.save(job)
     job_dir = os.path.dirname(audio_path)
     tag = f"[pipeline:{job_id[:8]}]"
 
@@ -28,140 +152,155 @@ def run_pipeline(job_id: str, audio_path: str) -> None:
         # ── Pre-processing: WebM → MP3 if needed ────────────────────
         upload_path = audio_path
         if audio_path.endswith(".webm"):
-            mp3_path = audio_path.rsplit(".", 1)[0] + ".mp3"
-            print(f"{tag} Converting WebM to MP3...")
-            subprocess.run(
-                ["ffmpeg", "-y", "-i", audio_path, mp3_path],
-                capture_output=True, check=True,
-            )
-            upload_path = mp3_path
+            logger.info(f"{tag} Converting WebM to MP3...")
+            upload_path = _convert_to_mp3(audio_path)
 
         # ── Stage 1: Gemini Analysis ────────────────────────────────
         job.stage = "gemini_analysis"
         job.progress = 5
-        print(f"{tag} Stage 1: Gemini analysis...")
+        jobs.save(job)
+        logger.info(f"{tag} Stage 1: Gemini analysis...")
 
         analysis = run_gemini_stage(job_id, upload_path)
 
         job.segments = analysis.segments
         job.progress = 40
-        print(f"{tag} Stage 1 complete. {len(analysis.segments)} segments.")
+        jobs.save(job)
+        logger.info(f"{tag} Stage 1 complete. {len(analysis.segments)} segments.")
 
-        # ── Stage 1.5: Speech Transcription ───────────────────────
-        job.stage = "speech_transcription"
-        job.progress = 42
-        print(f"{tag} Stage 1.5: Transcribing speech segments...")
+        # ── Stages 1.5 + 1.75 in the background ────────────────────
+        # Speech → tool calls and the MIDI build (stages 2-4) both only need
+        # the analysis, so the network-bound branch overlaps the MIDI work.
+        logger.info(f"{tag} Stage 1.5/1.75: Transcribing speech and parsing intents (background)...")
 
-        instruction_doc = run_transcribe_stage(analysis, upload_path, job_id)
+        with ThreadPoolExecutor(max_workers=1) as speech_pool:
+            speech_future = speech_pool.submit(
+                _parse_instructions, analysis, upload_path, job_id, job_dir
+            )
 
-        job.instruction_doc = instruction_doc
-        job.progress = 50
-        print(f"{tag} Stage 1.5 complete.")
+            # ── Stage 2: Score Builder ──────────────────────────────
+            job.stage = "score_building"
+            job.progress = 45
+            jobs.save(job)
+            logger.info(f"{tag} Stage 2: Building MusicLang scores...")
 
-        # ── Stage 1.75: Intent Parsing ──────────────────────────────
-        job.stage = "intent_parsing"
-        job.progress = 52
-        print(f"{tag} Stage 1.75: Parsing intents from speech...")
+            per_type_midis = _build_scores(analysis, job_dir)
 
-        action_log = run_intent_stage(instruction_doc, analysis, job_id, job_dir)
+            job.progress = 65
+            jobs.save(job)
+            logger.info(f"{tag} Stage 2 complete. {len(per_type_midis)} type MIDIs.")
 
-        job.action_log = action_log
-        job.progress = 55
-        print(f"{tag} Stage 1.75 complete. {len(action_log)} actions.")
+            # ── Stage 3: Instrument Mapper ──────────────────────────
+            job.stage = "instrument_mapping"
+            job.progress = 70
+            jobs.save(job)
+            logger.info(f"{tag} Stage 3: Mapping instruments...")
 
-        # ── Stage 2: Score Builder ──────────────────────────────────
-        job.stage = "score_building"
-        job.progress = 45
-        print(f"{tag} Stage 2: Building MusicLang scores...")
+            mapped_midis = run_instrument_mapper_stage(
+                per_type_midis, analysis.singing_instrument, job_dir
+            )
 
-        per_type_midis = run_score_builder_stage(analysis, job_dir)
+            job.progress = 80
+            jobs.save(job)
+            logger.info(f"{tag} Stage 3 complete.")
 
-        job.progress = 65
-        print(f"{tag} Stage 2 complete. {len(per_type_midis)} type MIDIs.")
+            # ── Stage 4: MIDI Merger ────────────────────────────────
+            job.stage = "midi_merging"
+            job.progress = 85
+            jobs.save(job)
+            logger.info(f"{tag} Stage 4: Merging MIDI tracks...")
 
-        # ── Stage 3: Instrument Mapper ──────────────────────────────
-        job.stage = "instrument_mapping"
-        job.progress = 70
-        print(f"{tag} Stage 3: Mapping instruments...")
+            output_path = os.path.join(job_dir, "output.mid")
+            run_midi_merger_stage(mapped_midis, output_path)
+
+            job.midi_path = output_path
+            job.progress = 88
+            jobs.save(job)
+            logger.info(f"{tag} Stage 4 complete.")
 
-        mapped_midis = run_instrument_mapper_stage(
-            per_type_midis, analysis.singing_instrument, job_dir
-        )
+            instruction_doc, action_log = speech_future.result()
 
-        job.progress = 80
-        print(f"{tag} Stage 3 complete.")
+        job.instruction_doc = instruction_doc
+        job.action_log = action_log
+        job.progress = 90
+        jobs.save(job)
+        logger.info(f"{tag} Stage 1.5/1.75 complete. {len(action_log)} actions.")
 
-        # ── Stage 3.5: Save individual tracks to saved_tracks/ ─────
-        saved_tracks_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-            "saved_tracks",
-        )
-        os.makedirs(saved_tracks_dir, exist_ok=True)
+        # ── Stage 4.5: Save individual tracks to saved_tracks/ ─────
+        # Done after intent parsing so the tool picker only sees prior tracks
+        os.makedirs(SAVED_TRACKS_DIR, exist_ok=True)
+        # One listing up front instead of a stat per candidate name
+        taken = {entry.name for entry in os.scandir(SAVED_TRACKS_DIR)}
 
-        for seg_type, mapped_path in mapped_midis.items():
+        for seg_type, mapped_midi in mapped_midis.items():
             if seg_type == "beatboxing":
                 track_name = "drums"
             else:
                 track_name = analysis.singing_instrument.value  # "piano" or "flute"
 
-            dest = os.path.join(saved_tracks_dir, f"{track_name}.mid")
             # Deduplication: append _2, _3, etc. if name already exists
+            filename = f"{track_name}.mid"
             counter = 2
-            while os.path.isfile(dest):
-                dest = os.path.join(saved_tracks_dir, f"{track_name}_{counter}.mid")
+            while filename in taken:
+                filename = f"{track_name}_{counter}.mid"
                 counter += 1
+            taken.add(filename)
 
-            shutil.copy2(mapped_path, dest)
-            print(f"{tag} Saved track: {os.path.basename(dest)}")
-
-        # ── Stage 4: MIDI Merger ────────────────────────────────────
-        job.stage = "midi_merging"
-        job.progress = 85
-        print(f"{tag} Stage 4: Merging MIDI tracks...")
-
-        output_path = os.path.join(job_dir, "output.mid")
-        run_midi_merger_stage(mapped_midis, output_path)
-
-        job.midi_path = output_path
-        job.progress = 90
-        print(f"{tag} Stage 4 complete.")
+            shutil.copy2(mapped_midi.filename, os.path.join(SAVED_TRACKS_DIR, filename))
+            logger.info(f"{tag} Saved track: {filename}")
 
         # ── Stage 5: Tool Dispatch ────────────────────────────────
         if action_log:
             job.stage = "tool_dispatch"
             job.progress = 92
-            print(f"{tag} Stage 5: Dispatching {len(action_log)} tool call(s)...")
+            jobs.save(job)
+            logger.info(f"{tag} Stage 5: Dispatching {len(action_log)} tool call(s)...")
 
+            # Calls that target the same file share one parsed copy of it
+            session = MidiSession()
             for i, action in enumerate(action_log):
                 tc = ToolCall(**action)
                 try:
-                    result = dispatch_tool_call(tc, job_dir)
-                    print(f"{tag}   [{i+1}] {tc.tool.value}: {result}")
+                    result = dispatch_tool_call(tc, job_dir, session)
+                    logger.info(f"{tag}   [{i+1}] {tc.tool.value}: {result}")
                 except NotImplementedError:
-                    print(f"{tag}   [{i+1}] {tc.tool.value}: skipped (not implemented)")
+                    logger.info(f"{tag}   [{i+1}] {tc.tool.value}: skipped (not implemented)")
                 except Exception as exc:
-                    print(f"{tag}   [{i+1}] {tc.tool.value}: failed ({exc})")
+                    logger.warning(f"{tag}   [{i+1}] {tc.tool.value}: failed ({exc})")
+            for path, exc in session.flush():
+                logger.warning(f"{tag}   write {os.path.basename(path)}: failed ({exc})")
 
-            print(f"{tag} Stage 5 complete.")
+            logger.info(f"{tag} Stage 5 complete.")
 
         # ── Copy final output to midi-outputs/ ─────────────────────
-        midi_outputs_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "midi-outputs"
-        )
-        os.makedirs(midi_outputs_dir, exist_ok=True)
-        persistent_path = os.path.join(midi_outputs_dir, f"{job_id}.mid")
+        os.makedirs(MIDI_OUTPUTS_DIR, exist_ok=True)
+        persistent_path = os.path.join(MIDI_OUTPUTS_DIR, f"{job_id}.mid")
         shutil.copy2(output_path, persistent_path)
-        print(f"{tag} Saved to {persistent_path}")
+        logger.info(f"{tag} Saved to {persistent_path}")
 
         job.progress = 100
         job.stage = "complete"
         job.status = "complete"
-        print(f"{tag} Pipeline complete! MIDI at {output_path}")
+        jobs.save(job)
+        logger.info(f"{tag} Pipeline complete! MIDI at {output_path}")
 
     except Exception as e:
         job.status = "failed"
         job.error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
-        print(f"{tag} FAILED: {type(e).__name__}: {e}")
+        jobs.save(job)
+        logger.error(f"{tag} FAILED: {type(e).__name__}: {e}")
+
+    finally:
+        # Failed jobs are cleaned up too
+        try:
+            removed = _remove_intermediates(job, job_dir, upload_path=audio_path)
+        except OSError as exc:
+            logger.warning(f"{tag} Could not remove intermediate files ({exc})")
+        else:
+            if removed:
+                # Publish the cleared clip references
+                jobs.save(job)
+            logger.info(f"{tag} Removed {removed} intermediate file(s).")
 
 
 def run_edit_pipeline(job_id: str, audio_path: str) -> None:
@@ -170,25 +309,22 @@ def run_edit_pipeline(job_id: str, audio_path: str) -> None:
     job.status = "processing"
     job.progress = 0
     job.error = None
+    jobs.save(job)
     job_dir = os.path.dirname(audio_path)
     tag = f"[edit:{job_id[:8]}]"
+    upload_path = audio_path
 
     try:
         # ── Pre-processing: WebM → MP3 if needed ────────────────────
-        upload_path = audio_path
         if audio_path.endswith(".webm"):
-            mp3_path = audio_path.rsplit(".", 1)[0] + ".mp3"
-            print(f"{tag} Converting WebM to MP3...")
-            subprocess.run(
-                ["ffmpeg", "-y", "-i", audio_path, mp3_path],
-                capture_output=True, check=True,
-            )
-            upload_path = mp3_path
+            logger.info(f"{tag} Converting WebM to MP3...")
+            upload_path = _convert_to_mp3(audio_path)
 
         # ── Stage 1: Transcribe full audio ────────────────────────────
         job.stage = "speech_transcription"
         job.progress = 10
-        print(f"{tag} Transcribing voice command...")
+        jobs.save(job)
+        logger.info(f"{tag} Transcribing voice command...")
 
         from elevenlabs.client import ElevenLabs as _EL
         el_client = _EL(api_key=os.getenv("ELEVENLABS_API_KEY"))
@@ -199,58 +335,73 @@ def run_edit_pipeline(job_id: str, audio_path: str) -> None:
         instruction_doc = f'[SPEECH]: "{transcription}"'
         job.instruction_doc = instruction_doc
         job.progress = 40
-        print(f"{tag} Transcription: \"{transcription}\"")
+        jobs.save(job)
+        logger.info(f"{tag} Transcription: \"{transcription}\"")
 
         # ── Stage 2: Intent parsing ───────────────────────────────────
         job.stage = "intent_parsing"
         job.progress = 50
-        print(f"{tag} Parsing intents...")
+        jobs.save(job)
+        logger.info(f"{tag} Parsing intents...")
 
         action_log = run_intent_stage(instruction_doc, None, job_id, job_dir)
 
         job.action_log = action_log
         job.progress = 70
-        print(f"{tag} Intent parsing complete. {len(action_log)} tool call(s).")
+        jobs.save(job)
+        logger.info(f"{tag} Intent parsing complete. {len(action_log)} tool call(s).")
 
         # ── Stage 3: Tool dispatch ────────────────────────────────────
         if action_log:
             job.stage = "tool_dispatch"
             job.progress = 75
-            print(f"{tag} Dispatching {len(action_log)} tool call(s)...")
+            jobs.save(job)
+            logger.info(f"{tag} Dispatching {len(action_log)} tool call(s)...")
 
+            # Calls that target the same file share one parsed copy of it
+            session = MidiSession()
             for i, action in enumerate(action_log):
                 tc = ToolCall(**action)
                 try:
-                    result = dispatch_tool_call(tc, job_dir)
-                    print(f"{tag}   [{i+1}] {tc.tool.value}: {result}")
+                    result = dispatch_tool_call(tc, job_dir, session)
+                    logger.info(f"{tag}   [{i+1}] {tc.tool.value}: {result}")
                 except NotImplementedError:
-                    print(f"{tag}   [{i+1}] {tc.tool.value}: skipped (not implemented)")
+                    logger.info(f"{tag}   [{i+1}] {tc.tool.value}: skipped (not implemented)")
                 except Exception as exc:
-                    print(f"{tag}   [{i+1}] {tc.tool.value}: failed ({exc})")
+                    logger.warning(f"{tag}   [{i+1}] {tc.tool.value}: failed ({exc})")
+            for path, exc in session.flush():
+                logger.warning(f"{tag}   write {os.path.basename(path)}: failed ({exc})")
 
-            print(f"{tag} Tool dispatch complete.")
+            logger.info(f"{tag} Tool dispatch complete.")
         else:
-            print(f"{tag} No tool calls to dispatch.")
+            logger.info(f"{tag} No tool calls to dispatch.")
 
         # ── Copy updated output to midi-outputs/ ─────────────────────
         output_path = os.path.join(job_dir, "output.mid")
         if os.path.isfile(output_path):
             job.midi_path = output_path
-            midi_outputs_dir = os.path.join(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                "midi-outputs",
-            )
-            os.makedirs(midi_outputs_dir, exist_ok=True)
-            persistent_path = os.path.join(midi_outputs_dir, f"{job_id}.mid")
+            os.makedirs(MIDI_OUTPUTS_DIR, exist_ok=True)
+            persistent_path = os.path.join(MIDI_OUTPUTS_DIR, f"{job_id}.mid")
             shutil.copy2(output_path, persistent_path)
-            print(f"{tag} Saved to {persistent_path}")
+            logger.info(f"{tag} Saved to {persistent_path}")
 
         job.progress = 100
         job.stage = "complete"
         job.status = "complete"
-        print(f"{tag} Edit pipeline complete!")
+        jobs.save(job)
+        logger.info(f"{tag} Edit pipeline complete!")
 
     except Exception as e:
         job.status = "failed"
         job.error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
-        print(f"{tag} FAILED: {type(e).__name__}: {e}")
+        jobs.save(job)
+        logger.error(f"{tag} FAILED: {type(e).__name__}: {e}")
+
+    finally:
+        # The job dir is shared with the original run, so only the converted
+        # upload is ours to delete
+        if upload_path != audio_path:
+            try:
+                os.remove(upload_path)
+            except FileNotFoundError:
+                pass
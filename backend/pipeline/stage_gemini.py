@@ -1,12 +1,56 @@
+import logging
 import os
+import subprocess
 import time
 
+import httpx
 from google import genai
 
 from models import GeminiAnalysis
 from pipeline.prompts import ANALYSIS_PROMPT
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+# One client shared by every job; its pooled keep-alive connections let
+# concurrent pipelines reuse TLS sessions instead of handshaking per request
+GEMINI_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+client = genai.Client(
+    api_key=os.getenv("GEMINI_API_KEY"),
+    http_options={
+        "client_args": {"limits": GEMINI_HTTP_LIMITS},
+        "async_client_args": {"limits": GEMINI_HTTP_LIMITS},
+    },
+)
+
+MODEL = "gemini-3-flash-preview"
+
+RESPONSE_SCHEMA = GeminiAnalysis.model_json_schema()
+
+# Gemini downsamples audio to 16 kbps mono before analysis, so large uploads
+# can be re-encoded down to that resolution without losing anything it sees.
+UPLOAD_TRANSCODE_THRESHOLD = 10 * 1024 * 1024  # 10MB
+
+# Uploaded file state polling: exponential backoff, capped, with a hard timeout
+FILE_POLL_INITIAL_DELAY = 0.25
+FILE_POLL_MAX_DELAY = 2.0
+FILE_POLL_TIMEOUT = 120.0
+
+
+def _prepare_upload(audio_path: str) -> str:
+    """Return the file to upload: the original, or a mono 16 kHz re-encode if large."""
+    if os.path.getsize(audio_path) <= UPLOAD_TRANSCODE_THRESHOLD:
+        return audio_path
+
+    small_path = audio_path.rsplit(".", 1)[0] + "_gemini.mp3"
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", audio_path,
+            "-ac", "1", "-ar", "16000", "-b:a", "32k", small_path,
+        ],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True,
+    )
+    return small_path
 
 
 def run_gemini_stage(job_id: str, audio_path: str) -> GeminiAnalysis:
@@ -14,13 +58,22 @@ def run_gemini_stage(job_id: str, audio_path: str) -> GeminiAnalysis:
     tag = f"[gemini:{job_id[:8]}]"
 
     # Upload file to Gemini Files API
-    print(f"{tag} Uploading audio to Gemini...")
-    myfile = client.files.upload(file=audio_path)
+    upload_path = _prepare_upload(audio_path)
+    logger.info(f"{tag} Uploading audio to Gemini ({os.path.getsize(upload_path)} bytes)...")
+    myfile = client.files.upload(file=upload_path)
 
-    # Wait for ACTIVE state
+    # Wait for ACTIVE state, backing off so short clips return quickly
+    if myfile.state.name == "PROCESSING":
+        logger.info(f"{tag} File processing, waiting...")
+    delay = FILE_POLL_INITIAL_DELAY
+    deadline = time.monotonic() + FILE_POLL_TIMEOUT
     while myfile.state.name == "PROCESSING":
-        print(f"{tag} File still processing, waiting...")
-        time.sleep(2)
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Gemini file still processing after {FILE_POLL_TIMEOUT:.0f}s"
+            )
+        time.sleep(delay)
+        delay = min(delay * 2, FILE_POLL_MAX_DELAY)
         myfile = client.files.get(name=myfile.name)
 
     if myfile.state.name != "ACTIVE":
@@ -29,13 +82,13 @@ def run_gemini_stage(job_id: str, audio_path: str) -> GeminiAnalysis:
         )
 
     # Call Gemini with combined prompt + audio
-    print(f"{tag} Analyzing audio...")
+    logger.info(f"{tag} Analyzing audio...")
     response = client.models.generate_content(
-        model="gemini-3-flash-preview",
+        model=MODEL,
         contents=[ANALYSIS_PROMPT, myfile],
         config={
             "response_mime_type": "application/json",
-            "response_json_schema": GeminiAnalysis.model_json_schema(),
+            "response_json_schema": RESPONSE_SCHEMA,
         },
     )
 
@@ -43,7 +96,7 @@ def run_gemini_stage(job_id: str, audio_path: str) -> GeminiAnalysis:
     result = GeminiAnalysis.model_validate_json(response.text)
 
     for seg in result.segments:
-        print(f"{tag}   {seg.type.value}: {seg.start:.2f}-{seg.end:.2f}s ({len(seg.chords)} chords)")
-    print(f"{tag} Done! {len(result.segments)} segments, tempo={result.tempo_bpm}")
+        logger.info(f"{tag}   {seg.type.value}: {seg.start:.2f}-{seg.end:.2f}s ({len(seg.chords)} chords)")
+    logger.info(f"{tag} Done! {len(result.segments)} segments, tempo={result.tempo_bpm}")
 
     return result
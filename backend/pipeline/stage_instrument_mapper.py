@@ -1,9 +1,19 @@
+import logging
+
 import mido
 
 from models import SingingInstrument
 
+logger = logging.getLogger(__name__)
+
 SINGING_PROGRAMS = {"piano": 0, "flute": 73}
 
+# mido message types that carry a channel; meta and system messages never do
+_CHANNEL_TYPES = frozenset({
+    "note_off", "note_on", "polytouch", "control_change",
+    "program_change", "aftertouch", "pitchwheel",
+})
+
 BASE_TRACK_INSTRUMENTS = {
     "beatboxing": {"channel": 9, "program": 0, "is_drum": True},
     "singing": {"channel": 1, "program": 73},
@@ -11,14 +21,44 @@ BASE_TRACK_INSTRUMENTS = {
 }
 
 
+def _remap_one(path: str, channel: int, program: int) -> mido.MidiFile:
+    """Move every channel message in the MIDI at path onto one channel/program.
+
+    Writes <name>_mapped.mid next to the input and returns the remapped
+    MidiFile, with its filename pointing at that file.
+    """
+    mid = mido.MidiFile(path)
+
+    for track in mid.tracks:
+        # Messages are rechannelled in place; mid is private to this call
+        remapped = [
+            mido.Message("program_change", channel=channel, program=program, time=0)
+        ]
+        append = remapped.append
+        for msg in track:
+            msg_type = msg.type
+            if msg_type in _CHANNEL_TYPES:
+                if msg_type == "program_change":
+                    continue
+                msg.channel = channel
+            append(msg)
+        track[:] = remapped
+
+    mapped_path = path.replace(".mid", "_mapped.mid")
+    mid.save(mapped_path)
+    mid.filename = mapped_path
+    return mid
+
+
 def run_instrument_mapper_stage(
     per_type_midis: dict[str, str],
     singing_instrument: SingingInstrument,
     job_dir: str,
-) -> dict[str, str]:
+) -> dict[str, mido.MidiFile]:
     """Remap MIDI channels/instruments per segment type.
 
-    Returns {seg_type: mapped_midi_path}.
+    Returns {seg_type: mapped MidiFile}. Each file is also saved to disk, at
+    its .filename, so the merger can use the parsed copy without rereading it.
     """
     # Build per-invocation instrument map (thread-safe, no globals)
     track_instruments = dict(BASE_TRACK_INSTRUMENTS)
@@ -42,27 +82,11 @@ def run_instrument_mapper_stage(
             fallback_state["next_channel"] += 1
         return ch, 48, False
 
-    mapped: dict[str, str] = {}
+    mapped: dict[str, mido.MidiFile] = {}
     for seg_type, path in per_type_midis.items():
-        mid = mido.MidiFile(path)
-        channel, program, _is_drum = get_instrument(seg_type)
-
-        for track in mid.tracks:
-            remapped = mido.MidiTrack()
-            remapped.append(
-                mido.Message("program_change", channel=channel, program=program, time=0)
-            )
-            for msg in track:
-                if hasattr(msg, "channel") and not msg.is_meta:
-                    msg = msg.copy(channel=channel)
-                    if msg.type == "program_change":
-                        continue
-                remapped.append(msg)
-            track[:] = remapped
-
-        mapped_path = path.replace(".mid", "_mapped.mid")
-        mid.save(mapped_path)
-        mapped[seg_type] = mapped_path
-        print(f"[instrument_mapper] {seg_type} -> ch{channel} prog{program} -> {mapped_path}")
+        channel, program, _ = get_instrument(seg_type)
+        mid = _remap_one(path, channel, program)
+        mapped[seg_type] = mid
+        logger.info(f"[instrument_mapper] {seg_type} -> ch{channel} prog{program} -> {mid.filename}")
 
     return mapped
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
-import glob
 import json
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from models import GeminiAnalysis
+from paths import LOG_DIR, SAVED_TRACKS_DIR, list_midi_files
 from intent.parser import pick_tools
 from intent.normalize import normalize_params
 
-_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-_SAVED_TRACKS_DIR = os.path.join(_BACKEND_DIR, "saved_tracks")
+logger = logging.getLogger(__name__)
+
+# Action-log dumps are opt-in (DEBUG_DUMPS=1) and written off the pipeline thread
+DEBUG_DUMPS = os.getenv("DEBUG_DUMPS") == "1"
+_dump_writer = ThreadPoolExecutor(max_workers=1)
+
+
+def _write_json(path: str, payload) -> None:
+    # Created on first dump rather than at import, so imports never touch disk
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
 
 
 def run_intent_stage(
@@ -21,15 +33,12 @@ def run_intent_stage(
     """
     tag = f"[intent:{job_id[:8]}]"
 
-    print(f"{tag} Running tool picker on instruction doc ({len(instruction_doc)} chars)...")
+    logger.info(f"{tag} Running tool picker on instruction doc ({len(instruction_doc)} chars)...")
 
     # Discover saved track names so the LLM can match user references
-    available_tracks: list[str] = []
-    if os.path.isdir(_SAVED_TRACKS_DIR):
-        for path in sorted(glob.glob(os.path.join(_SAVED_TRACKS_DIR, "*.mid"))):
-            available_tracks.append(os.path.splitext(os.path.basename(path))[0])
+    available_tracks = [os.path.splitext(name)[0] for name in list_midi_files(SAVED_TRACKS_DIR)]
     if available_tracks:
-        print(f"{tag} Available tracks: {available_tracks}")
+        logger.info(f"{tag} Available tracks: {available_tracks}")
 
     segments = analysis.segments if analysis else []
     result = pick_tools(instruction_doc, segments, available_tracks=available_tracks)
@@ -41,12 +50,12 @@ def run_intent_stage(
     # Serialize to list of dicts
     action_log = [tc.model_dump() for tc in result.tool_calls]
 
-    # Write to backend/log_files/
-    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "log_files")
-    os.makedirs(log_dir, exist_ok=True)
-    log_path = os.path.join(log_dir, f"action_log_{job_id}.json")
-    with open(log_path, "w") as f:
-        json.dump(action_log, f, indent=2)
+    logger.info(f"{tag} Tool picker complete. {len(action_log)} tool call(s).")
+
+    # Dump to backend/log_files/ for debugging
+    if DEBUG_DUMPS:
+        log_path = os.path.join(LOG_DIR, f"action_log_{job_id}.json")
+        _dump_writer.submit(_write_json, log_path, action_log)
+        logger.info(f"{tag} Action log → {log_path}")
 
-    print(f"{tag} Tool picker complete. {len(action_log)} tool call(s) → {log_path}")
     return action_log
@@ -1,42 +1,51 @@
+import logging
+
 import mido
 
+logger = logging.getLogger(__name__)
+
+# Meta events kept from the first track only (only meta messages have these types)
+_SHARED_META_TYPES = frozenset({"set_tempo", "time_signature"})
+
 
 def run_midi_merger_stage(
-    mapped_midis: dict[str, str], output_path: str
+    mapped_midis: dict[str, str | mido.MidiFile], output_path: str
 ) -> str:
     """Merge per-type mapped MIDIs into a single Type 1 multi-track MIDI.
 
+    Each value is a path or an already-parsed MidiFile (as returned by the
+    instrument mapper), which is merged without rereading it from disk.
     Returns the output file path.
     """
     combined = mido.MidiFile(type=1)
     ticks = None
     tempo_track_added = False
 
-    for seg_type, path in mapped_midis.items():
-        mid = mido.MidiFile(path)
+    for seg_type, source in mapped_midis.items():
+        mid = source if isinstance(source, mido.MidiFile) else mido.MidiFile(source)
         if ticks is None:
             combined.ticks_per_beat = mid.ticks_per_beat
             ticks = mid.ticks_per_beat
 
         for track in mid.tracks:
-            new_track = mido.MidiTrack()
-            new_track.append(
-                mido.MetaMessage("track_name", name=seg_type, time=0)
-            )
+            # Collect into a plain list and build the MidiTrack once
+            msgs = [mido.MetaMessage("track_name", name=seg_type, time=0)]
+            append = msgs.append
 
             for msg in track:
+                msg_type = msg.type
                 # Deduplicate tempo/time_signature meta events
-                if msg.is_meta and msg.type in ("set_tempo", "time_signature"):
+                if msg_type in _SHARED_META_TYPES:
                     if not tempo_track_added:
-                        new_track.append(msg)
+                        append(msg)
                     continue
-                if msg.is_meta and msg.type == "track_name":
+                if msg_type == "track_name":
                     continue
-                new_track.append(msg)
+                append(msg)
 
-            combined.tracks.append(new_track)
+            combined.tracks.append(mido.MidiTrack(msgs))
             tempo_track_added = True
 
     combined.save(output_path)
-    print(f"[midi_merger] Merged {len(mapped_midis)} tracks -> {output_path}")
+    logger.info(f"[midi_merger] Merged {len(mapped_midis)} tracks -> {output_path}")
     return output_path
@@ -1,5 +1,13 @@
+import hashlib
+import json
+import logging
 import os
+import shutil
+from concurrent.futures import Executor
+from functools import lru_cache
+from importlib import metadata
 
+from musiclang.write.melody import Melody
 from musiclang.write.score import Score
 from musiclang.write.library import (
     s0, s1, s2, s3, s4, s5, s6,
@@ -8,45 +16,76 @@ from musiclang.write.library import (
 )
 
 from models import GeminiAnalysis, NoteData, ChordData, Tonality
+from paths import MIDI_CACHE_DIR
+
+logger = logging.getLogger(__name__)
 
 # ── MusicLang lookup tables ──────────────────────────────────────────
 
-DEGREE_MAP = {1: I, 2: II, 3: III, 4: IV, 5: V, 6: VI, 7: VII}
-SCALE_NOTE_MAP = {0: s0, 1: s1, 2: s2, 3: s3, 4: s4, 5: s5, 6: s6}
+# Indexed directly after clamping: DEGREES[degree - 1], SCALE_NOTES[s]
+DEGREES = (I, II, III, IV, V, VI, VII)
+SCALE_NOTES = (s0, s1, s2, s3, s4, s5, s6)
 DURATION_MAP = {"w": "w", "h": "h", "q": "q", "e": "e", "s": "s"}
 QUALITY_MAP = {"M": "M", "m": "m"}
 
+# Content-addressed cache of rendered per-type MIDIs (in MIDI_CACHE_DIR),
+# keyed by a hash of everything that goes into the score, so re-runs skip
+# MusicLang entirely. Bump BUILDER_VERSION whenever the builder's output
+# changes; the MusicLang version is part of the key as well.
+BUILDER_VERSION = 1
+try:
+    MUSICLANG_VERSION = metadata.version("musiclang")
+except metadata.PackageNotFoundError:
+    MUSICLANG_VERSION = "unknown"
+# Oldest-used entries beyond this many are pruned after each render
+MIDI_CACHE_MAX_FILES = int(os.getenv("MIDI_CACHE_MAX_FILES", "256"))
+
 # ── Builder helpers ──────────────────────────────────────────────────
 
 
-def build_note(note: NoteData):
-    """Convert a NoteData into a MusicLang Note."""
-    degree = max(0, min(6, note.s))
-    ml_note = SCALE_NOTE_MAP.get(degree, s0)
+@lru_cache(maxsize=4096)
+def _build_note_cached(s: int, octave: int, duration: str):
+    """Build the MusicLang Note for a (degree, octave, duration) key.
+
+    MusicLang never mutates notes when combining or rendering them, so one
+    instance is shared by every occurrence of the same key.
+    """
+    ml_note = SCALE_NOTES[max(0, min(6, s))]
 
-    if note.octave != 0:
-        ml_note = ml_note.o(note.octave)
+    if octave != 0:
+        ml_note = ml_note.o(octave)
 
-    dur_attr = DURATION_MAP.get(note.duration.value, "q")
+    dur_attr = DURATION_MAP.get(duration, "q")
     ml_note = getattr(ml_note, dur_attr)
     return ml_note
 
 
+def build_note(note: NoteData):
+    """Convert a NoteData into a MusicLang Note."""
+    return _build_note_cached(note.s, note.octave, note.duration.value)
+
+
 def build_melody(notes: list[NoteData]):
     """Concatenate note dicts into a MusicLang melody."""
     if not notes:
         return r.q
-    melody = build_note(notes[0])
-    for n in notes[1:]:
-        melody = melody + build_note(n)
-    return melody
+    if len(notes) == 1:
+        return build_note(notes[0])
+    # One Melody over all notes; chaining + would copy the list once per note
+    return Melody([build_note(n) for n in notes])
+
 
+def build_chord_exprs(tonality_obj) -> tuple:
+    """Bind every chord degree to the score's tonality once: result[degree - 1]."""
+    return tuple(degree % tonality_obj for degree in DEGREES)
 
-def build_chord(chord: ChordData, tonality_obj):
-    """Build a MusicLang chord expression with instrument melodies."""
-    deg = max(1, min(7, chord.degree))
-    chord_degree = DEGREE_MAP.get(deg, I)
-    chord_expr = chord_degree % tonality_obj
+
+def build_chord(chord: ChordData, chord_exprs: tuple):
+    """Build a MusicLang chord expression with instrument melodies.
+
+    chord_exprs comes from build_chord_exprs for the score's tonality.
+    """
+    chord_expr = chord_exprs[max(1, min(7, chord.degree)) - 1]
 
     if not chord.instruments:
         return chord_expr(piano=r.q)
@@ -64,22 +103,147 @@ def build_chord(chord: ChordData, tonality_obj):
     return chord_expr(**kwargs)
 
 
+def _chord_key(chord: ChordData) -> tuple:
+    """Hashable identity of everything build_chord reads from a ChordData."""
+    return (
+        chord.degree,
+        tuple(
+            (inst_name, tuple((n.s, n.octave, n.duration.value) for n in notes_list))
+            for inst_name, notes_list in chord.instruments.items()
+        ),
+    )
+
+
 def build_tonality(tonality: Tonality):
     """Convert Tonality model to a MusicLang Tonality object."""
-    deg = max(1, min(7, tonality.degree))
     quality = QUALITY_MAP.get(tonality.quality, "M")
-    base = DEGREE_MAP.get(deg, I)
+    base = DEGREES[max(1, min(7, tonality.degree)) - 1]
     return getattr(base, quality)
 
 
+def _score_cache_key(
+    analysis: GeminiAnalysis, time_sig: tuple[int, int], chords: list[ChordData]
+) -> str:
+    """Hash the inputs of one per-type score into a cache key."""
+    payload = json.dumps(
+        {
+            "builder": BUILDER_VERSION,
+            "musiclang": MUSICLANG_VERSION,
+            "tonality": analysis.tonality.model_dump(mode="json"),
+            "tempo": analysis.tempo_bpm,
+            "time_signature": time_sig,
+            "chords": [c.model_dump(mode="json") for c in chords],
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _store_in_cache(midi_path: str, cache_path: str) -> None:
+    """Copy a freshly rendered MIDI into the cache; failures only cost a rebuild."""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(MIDI_CACHE_DIR, exist_ok=True)
+        shutil.copyfile(midi_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError as exc:
+        logger.warning(f"[score_builder] Could not cache {midi_path} ({exc})")
+
+
+def _load_from_cache(cache_path: str, midi_path: str) -> bool:
+    """Copy a cached MIDI to midi_path; False on a miss."""
+    try:
+        shutil.copyfile(cache_path, midi_path)
+    except FileNotFoundError:
+        # Never cached, or pruned since
+        return False
+    # Mark it recently used, so pruning drops colder entries first
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass
+    return True
+
+
+def _prune_cache() -> None:
+    """Drop the least recently used cache entries beyond MIDI_CACHE_MAX_FILES."""
+    try:
+        with os.scandir(MIDI_CACHE_DIR) as entries:
+            cached = [
+                (entry.stat().st_mtime, entry.path)
+                for entry in entries if entry.name.endswith(".mid")
+            ]
+    except OSError:
+        return
+    excess = len(cached) - MIDI_CACHE_MAX_FILES
+    if excess <= 0:
+        return
+    cached.sort()
+    for _, path in cached[:excess]:
+        try:
+            os.remove(path)
+        except OSError:
+            # Already pruned by another job
+            pass
+
+
+def _render_type(
+    seg_type: str,
+    chord_data_list: list[ChordData],
+    tonality: Tonality,
+    tempo: float,
+    time_sig: tuple[int, int],
+    midi_path: str,
+    cache_path: str,
+    chord_cache: dict[tuple, object] | None = None,
+) -> str:
+    """Build and render one segment type's Score to midi_path, then cache it.
+
+    Module-level so it can run in a worker process. Identical chords recur
+    across segments; each distinct one is built once per chord_cache.
+    """
+    chord_exprs = build_chord_exprs(build_tonality(tonality))
+    if chord_cache is None:
+        chord_cache = {}
+
+    chord_list = []
+    for chord_data in chord_data_list:
+        key = _chord_key(chord_data)
+        chord = chord_cache.get(key)
+        if chord is None:
+            chord = chord_cache[key] = build_chord(chord_data, chord_exprs)
+        chord_list.append(chord)
+
+    score = Score(chord_list, tempo=tempo, time_signature=time_sig)
+    score.to_midi(midi_path)
+    _store_in_cache(midi_path, cache_path)
+    logger.info(f"[score_builder] {seg_type} -> {midi_path}")
+    return midi_path
+
+
+def init_score_worker() -> None:
+    """Configure logging in a fresh score-builder process.
+
+    Used as the process pool initializer. It lives here, not in the
+    orchestrator, so spawned workers only import this module (and MusicLang),
+    not the API clients and job store the orchestrator sets up at import.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
 # ── Stage entry point ────────────────────────────────────────────────
 
 
 def run_score_builder_stage(
-    analysis: GeminiAnalysis, job_dir: str
+    analysis: GeminiAnalysis, job_dir: str, executor: Executor | None = None
 ) -> dict[str, str]:
     """Build MusicLang scores per segment type and export to MIDI.
 
+    With an executor (e.g. a process pool), the types that are not already
+    cached render in parallel on it; otherwise they render one by one here.
+    If one type fails, renders not yet started are cancelled and the error
+    is raised.
     Returns {seg_type: midi_path} mapping.
     """
     tempo = analysis.tempo_bpm
@@ -89,29 +253,51 @@ def run_score_builder_stage(
     else:
         time_sig = (4, 4)
 
-    tonality_obj = build_tonality(analysis.tonality)
-
     # Group chords by segment type (skip silence/speech)
-    chords_by_type: dict[str, list] = {}
+    chord_data_by_type: dict[str, list[ChordData]] = {}
     for segment in analysis.segments:
         seg_type = segment.type.value
-        if seg_type in ("silence", "speech"):
+        if seg_type in ("silence", "speech") or not segment.chords:
             continue
-        for chord_data in segment.chords:
-            chords_by_type.setdefault(seg_type, []).append(
-                build_chord(chord_data, tonality_obj)
-            )
+        chord_data_by_type.setdefault(seg_type, []).extend(segment.chords)
 
-    # Build one Score per type and export to MIDI
+    # Export one Score per type to MIDI, unless an identical score was
+    # rendered before
     midi_paths: dict[str, str] = {}
-    for seg_type, chord_list in chords_by_type.items():
-        if not chord_list:
-            chord_list = [(I % tonality_obj)(piano=r.w)]
-
-        score = Score(chord_list, tempo=tempo, time_signature=time_sig)
+    to_render = []
+    for seg_type, chord_data_list in chord_data_by_type.items():
         midi_path = os.path.join(job_dir, f"{seg_type}.mid")
-        score.to_midi(midi_path)
+        cache_path = os.path.join(
+            MIDI_CACHE_DIR, f"{_score_cache_key(analysis, time_sig, chord_data_list)}.mid"
+        )
         midi_paths[seg_type] = midi_path
-        print(f"[score_builder] {seg_type} -> {midi_path}")
 
+        if _load_from_cache(cache_path, midi_path):
+            logger.info(f"[score_builder] {seg_type} -> {midi_path} (cached)")
+            continue
+
+        to_render.append(
+            (seg_type, chord_data_list, analysis.tonality, tempo, time_sig, midi_path, cache_path)
+        )
+
+    if executor is None:
+        chord_cache: dict[tuple, object] = {}
+        for args in to_render:
+            _render_type(*args, chord_cache=chord_cache)
+    else:
+        futures = []
+        try:
+            for args in to_render:
+                futures.append(executor.submit(_render_type, *args))
+            for future in futures:
+                future.result()
+        except BaseException:
+            # The job fails either way; don't leave the other types rendering.
+            # A BrokenProcessPool propagates so the caller can replace the pool.
+            for future in futures:
+                future.cancel()
+            raise
+
+    if to_render:
+        _prune_cache()
     return midi_paths
@@ -1,18 +1,42 @@
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from elevenlabs.client import ElevenLabs
 from pydub import AudioSegment
 
-from models import GeminiAnalysis, SegmentType
+from models import GeminiAnalysis, Segment, SegmentType
+
+logger = logging.getLogger(__name__)
 
 client = ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
 
 # Segment types that contain musical content
 MUSICAL_TYPES = {SegmentType.singing, SegmentType.humming, SegmentType.beatboxing}
 
+# Max concurrent ElevenLabs speech-to-text requests per job
+STT_MAX_WORKERS = int(os.getenv("STT_MAX_WORKERS", "8"))
+
+# Speech shorter than this (1600 samples at 16 kHz) holds no words worth an STT call
+MIN_SPEECH_SECONDS = 0.1
+
+
+def _transcribe_one(seg: Segment) -> Segment:
+    """Transcribe a sliced speech clip via ElevenLabs and store the text on the segment."""
+    with open(seg.audio_clip_path, "rb") as f:
+        result = client.speech_to_text.convert(
+            model_id="scribe_v1",
+            file=f,
+        )
+    seg.transcription = result.text.strip()
+    return seg
+
 
 def run_transcribe_stage(
-    analysis: GeminiAnalysis, audio_path: str, job_id: str
+    analysis: GeminiAnalysis,
+    audio_path: str,
+    job_id: str,
+    max_workers: int = STT_MAX_WORKERS,
 ) -> str:
     """Slice all segments, transcribe speech via ElevenLabs, and build an instruction document."""
     tag = f"[transcribe:{job_id[:8]}]"
@@ -22,36 +46,49 @@ def run_transcribe_stage(
 
     job_dir = os.path.dirname(audio_path)
 
+    speech_segments: list[tuple[int, Segment]] = []
+    skipped_speech = 0
     for i, seg in enumerate(analysis.segments):
         if seg.type == SegmentType.silence:
             continue
+        if seg.type == SegmentType.speech and seg.end - seg.start < MIN_SPEECH_SECONDS:
+            skipped_speech += 1
+            continue
 
         start_ms = int(seg.start * 1000)
         end_ms = int(seg.end * 1000)
         clip = audio[start_ms:end_ms]
+        if seg.type == SegmentType.speech:
+            # Speech only goes to STT, which works at 16 kHz mono anyway
+            clip = clip.set_channels(1).set_frame_rate(16000)
 
-        # Save clip — named by type and index
-        clip_filename = f"segment_{i}_{seg.type.value}.mp3"
+        # Save clip — named by type and index. WAV is written by pydub
+        # directly, avoiding an ffmpeg encode per segment.
+        clip_filename = f"segment_{i}_{seg.type.value}.wav"
         clip_path = os.path.join(job_dir, clip_filename)
-        clip.export(clip_path, format="mp3")
+        clip.export(clip_path, format="wav")
         seg.audio_clip_path = clip_path
 
-        print(f"{tag} Sliced segment {i} ({seg.type.value}, {seg.start:.1f}s-{seg.end:.1f}s) → {clip_filename}")
+        logger.info(f"{tag} Sliced segment {i} ({seg.type.value}, {seg.start:.1f}s-{seg.end:.1f}s) → {clip_filename}")
 
-        # Transcribe speech segments
         if seg.type == SegmentType.speech:
-            print(f"{tag} Transcribing segment {i}...")
-            with open(clip_path, "rb") as f:
-                result = client.speech_to_text.convert(
-                    model_id="scribe_v1",
-                    file=f,
-                )
-            seg.transcription = result.text.strip()
-            print(f"{tag}   → \"{seg.transcription}\"")
+            speech_segments.append((i, seg))
+
+    if skipped_speech:
+        logger.info(f"{tag} Skipped {skipped_speech} speech segment(s) shorter than {MIN_SPEECH_SECONDS}s")
+
+    # Transcribe speech segments concurrently — each is an independent API call
+    if speech_segments:
+        logger.info(f"{tag} Transcribing {len(speech_segments)} speech segment(s)...")
+        workers = min(max_workers, len(speech_segments))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_transcribe_one, (seg for _, seg in speech_segments))
+            for (i, _), seg in zip(speech_segments, results):
+                logger.info(f"{tag}   segment {i} → \"{seg.transcription}\"")
 
     # Build instruction document
     instruction_doc = _build_instruction_doc(analysis)
-    print(f"{tag} Instruction document built ({len(instruction_doc)} chars).")
+    logger.info(f"{tag} Instruction document built ({len(instruction_doc)} chars).")
 
     return instruction_doc
 
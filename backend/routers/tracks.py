@@ -1,42 +1,93 @@
 import os
-import glob
+import re
+import stat
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 
+from paths import SAVED_TRACKS_DIR, list_midi_files
+
 router = APIRouter(prefix="/api")
 
-_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-SAVED_TRACKS_DIR = os.path.join(_BACKEND_DIR, "saved_tracks")
+# Path separators or parent references; rejected to prevent directory traversal
+_INVALID_FILENAME = re.compile(r"[\\/]|\.\.")
+
+# One entity-tag in an If-None-Match list; tags may themselves contain commas
+_ENTITY_TAG = re.compile(r'(?:W/)?"[^"]*"')
 
 
 @router.get("/tracks")
 async def list_tracks():
     """Return a list of all saved MIDI tracks."""
     os.makedirs(SAVED_TRACKS_DIR, exist_ok=True)
-    tracks = []
-    for path in sorted(glob.glob(os.path.join(SAVED_TRACKS_DIR, "*.mid"))):
-        filename = os.path.basename(path)
-        tracks.append({
-            "filename": filename,
-            "url": f"/api/tracks/{filename}/midi",
-        })
-    return tracks
+    return [
+        {"filename": filename, "url": f"/api/tracks/{filename}/midi"}
+        for filename in list_midi_files(SAVED_TRACKS_DIR)
+    ]
 
 
 @router.get("/tracks/{filename}/midi")
-async def get_track(filename: str):
-    """Serve an individual saved track MIDI file."""
-    # Prevent directory traversal
-    if "/" in filename or "\\" in filename or ".." in filename:
+async def get_track(filename: str, request: Request):
+    """Serve an individual saved track MIDI file.
+
+    Tracks are edited in place by the tools, so clients must revalidate
+    (no-cache), but an unchanged file is answered with 304 via its ETag.
+    """
+    if _INVALID_FILENAME.search(filename):
         raise HTTPException(status_code=400, detail="Invalid filename")
 
     path = os.path.join(SAVED_TRACKS_DIR, filename)
-    if not os.path.isfile(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
         raise HTTPException(status_code=404, detail=f"Track '{filename}' not found")
 
-    return FileResponse(path, media_type="audio/midi", filename=filename)
+    response = FileResponse(
+        path,
+        media_type="audio/midi",
+        filename=filename,
+        stat_result=st,
+        headers={"Cache-Control": "no-cache"},
+    )
+    etag = response.headers["etag"]
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return response
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (RFC 9110 §13.1.2).
+
+    The header is a comma-separated list compared weakly, so W/ prefixes are
+    ignored on both sides; "*" matches any current representation.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.removeprefix("W/") == opaque for tag in _ENTITY_TAG.findall(if_none_match))
+
+
+def _rename_no_clobber(old_path: str, new_path: str) -> None:
+    """Move old_path to new_path, raising FileExistsError instead of overwriting.
+
+    Hard-linking then unlinking makes the existence check and the move one
+    atomic step, so a concurrent save or rename can never be clobbered.
+    """
+    try:
+        os.link(old_path, new_path)
+    except (FileExistsError, FileNotFoundError):
+        raise
+    except OSError:
+        # Filesystem without hard links: fall back to a checked rename
+        if os.path.exists(new_path):
+            raise FileExistsError(new_path)
+        os.rename(old_path, new_path)
+        return
+    os.unlink(old_path)
 
 
 class RenameRequest(BaseModel):
@@ -46,9 +97,8 @@ class RenameRequest(BaseModel):
 @router.patch("/tracks/{filename}")
 async def rename_track(filename: str, body: RenameRequest):
     """Rename a saved track file."""
-    for name in [filename, body.new_name]:
-        if "/" in name or "\\" in name or ".." in name:
-            raise HTTPException(status_code=400, detail="Invalid filename")
+    if _INVALID_FILENAME.search(filename) or _INVALID_FILENAME.search(body.new_name):
+        raise HTTPException(status_code=400, detail="Invalid filename")
 
     new_filename = body.new_name if body.new_name.endswith(".mid") else f"{body.new_name}.mid"
 
@@ -57,8 +107,13 @@ async def rename_track(filename: str, body: RenameRequest):
 
     if not os.path.isfile(old_path):
         raise HTTPException(status_code=404, detail=f"Track '{filename}' not found")
-    if os.path.isfile(new_path) and old_path != new_path:
-        raise HTTPException(status_code=409, detail=f"A track named '{new_filename}' already exists")
 
-    os.rename(old_path, new_path)
+    if old_path != new_path:
+        try:
+            _rename_no_clobber(old_path, new_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Track '{filename}' not found")
+        except FileExistsError:
+            raise HTTPException(status_code=409, detail=f"A track named '{new_filename}' already exists")
+
     return {"filename": new_filename, "url": f"/api/tracks/{new_filename}/midi"}
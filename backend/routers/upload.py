@@ -1,24 +1,97 @@
+import asyncio
+import logging
 import os
-import uuid
+import secrets
+import shutil
 from concurrent.futures import ThreadPoolExecutor
 
 from fastapi import APIRouter, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 
 from models import JobStatus
+from paths import JOBS_DIR
 from pipeline.orchestrator import jobs, run_pipeline, run_edit_pipeline
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api")
 
 _executor = ThreadPoolExecutor(max_workers=2)
 
 ALLOWED_EXTENSIONS = {".mp3", ".webm"}
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024  # 64KB
+
+
+def _too_large_detail() -> str:
+    return f"File too large. Max size: {MAX_FILE_SIZE // (1024*1024)}MB"
+
+
+class UploadSizeLimitMiddleware:
+    """Reject requests whose Content-Length exceeds the upload limit with 413.
+
+    Starlette spools a multipart body to a temp file before the endpoint
+    runs, so this is the only place an oversized upload can be refused
+    before it is received. Bodies sent without a Content-Length (chunked)
+    are still spooled, then rejected by _save_upload.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+                        response = JSONResponse({"detail": _too_large_detail()}, status_code=413)
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+
+def _new_job_id() -> str:
+    """Return a random, URL- and path-safe job id (96 bits, 16 chars)."""
+    return secrets.token_urlsafe(12)
+
+
+def _copy_upload(src, dest_path: str) -> int:
+    """Copy an upload's file object to dest_path in chunks, stopping past MAX_FILE_SIZE.
+
+    Returns the number of bytes read; an oversized copy is deleted.
+    """
+    size = 0
+    with open(dest_path, "wb") as f:
+        while chunk := src.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                break
+            f.write(chunk)
+
+    if size > MAX_FILE_SIZE:
+        os.remove(dest_path)
+    return size
+
+
+async def _save_upload(file: UploadFile, dest_path: str) -> int:
+    """Save an upload to dest_path without blocking the event loop.
+
+    Returns the number of bytes written. The upload has already been
+    received by now; copying stops, and the upload is rejected with 413, as
+    soon as it crosses MAX_FILE_SIZE.
+    """
+    size = await asyncio.to_thread(_copy_upload, file.file, dest_path)
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=_too_large_detail())
+    return size
 
 
 @router.post("/upload")
 async def upload_audio(file: UploadFile):
-    print(f"[upload] Received file: {file.filename}")
+    logger.info(f"[upload] Received file: {file.filename}")
 
     # Validate file type
     if not file.filename:
@@ -31,25 +104,19 @@ async def upload_audio(file: UploadFile):
             detail=f"Unsupported file type: {ext}. Allowed: MP3, WebM.",
         )
 
-    # Read file and check size
-    content = await file.read()
-    print(f"[upload] File transfer complete: {len(content)} bytes")
-
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Max size: {MAX_FILE_SIZE // (1024*1024)}MB",
-        )
-
-    # Create job directory and save file
-    job_id = str(uuid.uuid4())
-    job_dir = os.path.join("/tmp", "audio_midi_jobs", job_id)
+    # Create job directory and stream the file into it
+    job_id = _new_job_id()
+    job_dir = os.path.join(JOBS_DIR, job_id)
     os.makedirs(job_dir, exist_ok=True)
 
     input_path = os.path.join(job_dir, f"input{ext}")
-    with open(input_path, "wb") as f:
-        f.write(content)
-    print(f"[upload] File saved to {input_path}")
+    try:
+        size = await _save_upload(file, input_path)
+    except HTTPException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+    logger.info(f"[upload] File transfer complete: {size} bytes")
+    logger.info(f"[upload] File saved to {input_path}")
 
     # Initialize job
     jobs[job_id] = JobStatus(id=job_id, status="pending", progress=0)
@@ -71,7 +138,7 @@ async def get_job_status(job_id: str):
 @router.post("/jobs/{job_id}/edit")
 async def edit_job(job_id: str, file: UploadFile):
     """Accept a voice command recording and run the lightweight edit pipeline."""
-    print(f"[edit] Received edit for job {job_id[:8]}: {file.filename}")
+    logger.info(f"[edit] Received edit for job {job_id[:8]}: {file.filename}")
 
     job = jobs.get(job_id)
     if not job:
@@ -89,22 +156,16 @@ async def edit_job(job_id: str, file: UploadFile):
             detail=f"Unsupported file type: {ext}. Allowed: MP3, WebM.",
         )
 
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File too large")
-
     # Save to existing job directory
-    job_dir = os.path.dirname(job.midi_path) if job.midi_path else os.path.join(
-        "/tmp", "audio_midi_jobs", job_id
-    )
+    job_dir = os.path.dirname(job.midi_path) if job.midi_path else os.path.join(JOBS_DIR, job_id)
     edit_path = os.path.join(job_dir, f"edit_input{ext}")
-    with open(edit_path, "wb") as f:
-        f.write(content)
+    await _save_upload(file, edit_path)
 
     # Reset job for edit processing
     job.progress = 0
     job.stage = "speech_transcription"
     job.error = None
+    jobs.save(job)
 
     _executor.submit(run_edit_pipeline, job_id, edit_path)
 
@@ -119,7 +180,7 @@ async def standalone_edit(file: UploadFile):
     intent → tool dispatch against saved_tracks/), and returns the new job_id
     so the frontend can poll for progress.
     """
-    print(f"[edit] Received standalone edit: {file.filename}")
+    logger.info(f"[edit] Received standalone edit: {file.filename}")
 
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename provided")
@@ -131,17 +192,16 @@ async def standalone_edit(file: UploadFile):
             detail=f"Unsupported file type: {ext}. Allowed: MP3, WebM.",
         )
 
-    content = await file.read()
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File too large")
-
-    job_id = str(uuid.uuid4())
-    job_dir = os.path.join("/tmp", "audio_midi_jobs", job_id)
+    job_id = _new_job_id()
+    job_dir = os.path.join(JOBS_DIR, job_id)
     os.makedirs(job_dir, exist_ok=True)
 
     edit_path = os.path.join(job_dir, f"edit_input{ext}")
-    with open(edit_path, "wb") as f:
-        f.write(content)
+    try:
+        await _save_upload(file, edit_path)
+    except HTTPException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise
 
     jobs[job_id] = JobStatus(id=job_id, status="pending", progress=0)
 
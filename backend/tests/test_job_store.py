@@ -0,0 +1,162 @@
+import pytest
+
+from models import JobStatus
+from pipeline import job_store
+from pipeline.job_store import JobStore
+
+
+class FakeClock:
+    """Stands in for the time module so TTLs can be crossed without sleeping."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(job_store, "time", fake)
+    return fake
+
+
+def _job(job_id, status="complete", progress=100):
+    return JobStatus(id=job_id, status=status, progress=progress)
+
+
+class TestInMemory:
+
+    def test_set_and_get(self, clock):
+        store = JobStore(ttl=60)
+        store["a"] = _job("a")
+        assert store["a"].status == "complete"
+        assert "a" in store
+        assert len(store) == 1
+
+    def test_missing_job(self, clock):
+        store = JobStore(ttl=60)
+        assert store.get("nope") is None
+        assert "nope" not in store
+        with pytest.raises(KeyError):
+            store["nope"]
+
+    def test_finished_job_evicted_after_ttl(self, clock):
+        store = JobStore(ttl=60)
+        store["a"] = _job("a")
+        clock.advance(61)
+        store["b"] = _job("b")
+        assert store.get("a") is None
+        assert "b" in store
+
+    def test_poll_extends_ttl(self, clock):
+        store = JobStore(ttl=60)
+        store["a"] = _job("a")
+        clock.advance(50)
+        assert store.get("a") is not None
+        clock.advance(50)
+        store["b"] = _job("b")
+        assert store.get("a") is not None
+
+    def test_no_ttl_keeps_finished_jobs(self, clock):
+        store = JobStore(ttl=None)
+        store["a"] = _job("a")
+        clock.advance(10 ** 9)
+        store["b"] = _job("b")
+        assert store["a"].status == "complete"
+
+    def test_active_job_never_evicted(self, clock):
+        store = JobStore(ttl=60)
+        store["a"] = _job("a", status="processing", progress=40)
+        clock.advance(10_000)
+        store["b"] = _job("b")
+        assert store["a"].status == "processing"
+
+
+class TestSQLite:
+
+    def test_save_get_round_trip(self, clock, tmp_path):
+        db = str(tmp_path / "jobs.db")
+        store = JobStore(ttl=60, db_path=db)
+        job = _job("a", status="processing", progress=10)
+        store["a"] = job
+        job.progress = 55
+        store.save(job)
+
+        fresh = JobStore(ttl=60, db_path=db)
+        loaded = fresh["a"]
+        assert loaded.progress == 55
+        assert loaded.status == "processing"
+
+    def test_loaded_copy_is_kept_in_memory(self, clock, tmp_path):
+        db = str(tmp_path / "jobs.db")
+        JobStore(ttl=60, db_path=db)["a"] = _job("a")
+
+        other = JobStore(ttl=60, db_path=db)
+        job = other["a"]
+        assert len(other) == 1
+        assert other["a"] is job
+
+    def test_two_stores_share_updates(self, clock, tmp_path):
+        db = str(tmp_path / "jobs.db")
+        worker_a = JobStore(ttl=60, db_path=db)
+        worker_b = JobStore(ttl=60, db_path=db)
+
+        # A creates the job; B runs an edit on it and publishes the result
+        worker_a["a"] = _job("a", status="complete", progress=100)
+        clock.advance(1)
+        job = worker_b["a"]
+        job.status = "processing"
+        job.progress = 20
+        worker_b.save(job)
+
+        assert worker_a["a"].status == "processing"
+        clock.advance(1)
+        job.status = "complete"
+        job.progress = 100
+        worker_b.save(job)
+
+        polled = worker_a["a"]
+        assert polled.status == "complete"
+        assert polled.progress == 100
+
+    def test_own_newer_write_wins(self, clock, tmp_path):
+        db = str(tmp_path / "jobs.db")
+        store = JobStore(ttl=60, db_path=db)
+        job = _job("a", status="processing", progress=10)
+        store["a"] = job
+        clock.advance(1)
+        job.progress = 30
+        store.save(job)
+        assert store["a"] is job
+
+    def test_db_expiry_counts_from_last_poll(self, clock, tmp_path):
+        db = str(tmp_path / "jobs.db")
+        worker_a = JobStore(ttl=60, db_path=db)
+        worker_b = JobStore(ttl=60, db_path=db)
+        worker_a["a"] = _job("a")
+
+        clock.advance(50)
+        assert worker_b.get("a") is not None
+        clock.advance(50)
+        worker_a["b"] = _job("b")  # runs eviction
+        assert JobStore(ttl=60, db_path=db).get("a") is not None
+
+        clock.advance(61)
+        worker_a["c"] = _job("c")
+        assert JobStore(ttl=60, db_path=db).get("a") is None
+
+    def test_no_ttl_keeps_db_rows(self, clock, tmp_path):
+        db = str(tmp_path / "jobs.db")
+        store = JobStore(ttl=None, db_path=db)
+        store["a"] = _job("a")
+        clock.advance(10 ** 9)
+        store["b"] = _job("b")
+        assert JobStore(ttl=None, db_path=db).get("a") is not None
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pretty_midi
+import pytest
+
+from tools import progression_change
+from tools.progression_change import _detect_key, _key_from_histogram
+
+SAVED_TRACKS = os.path.join(os.path.dirname(__file__), "..", "saved_tracks")
+
+
+def _midi_from_histogram(hist, is_drum=False):
+    """One note per non-empty pitch class, held for 0.5s per unit of weight."""
+    midi = pretty_midi.PrettyMIDI()
+    inst = pretty_midi.Instrument(program=0, is_drum=is_drum)
+    t = 0.0
+    for pc, weight in enumerate(hist):
+        if weight:
+            inst.notes.append(pretty_midi.Note(velocity=100, pitch=60 + pc, start=t, end=t + 0.5 * weight))
+            t += 0.5 * weight
+    midi.instruments.append(inst)
+    return midi
+
+
+# Histograms indexed C, C#, D, ..., B; expected keys agree with music21's analyze("key")
+HISTOGRAMS = [
+    ([2, 0, 1, 0, 1, 1, 0, 2, 0, 1, 0, 1], (0, "major", "C major")),
+    ([1, 0, 1, 0, 1, 0, 0, 0, 0, 3, 0, 1], (9, "minor", "A minor")),
+    ([1, 0, 2, 0, 1, 0, 1, 3, 0, 1, 0, 2], (7, "major", "G major")),
+    ([0, 2, 0, 0, 0, 1, 3, 0, 1, 2, 0, 1], (6, "minor", "F# minor")),
+    ([1, 0, 0, 3, 0, 1, 0, 2, 2, 0, 2, 0], (3, "major", "E- major")),
+]
+
+
+class TestKeyFromHistogram:
+
+    @pytest.mark.parametrize("hist, expected", HISTOGRAMS)
+    def test_fixed_histograms(self, hist, expected):
+        assert _key_from_histogram(np.array(hist, dtype=float)) == expected
+
+    @pytest.mark.parametrize("hist, expected", HISTOGRAMS)
+    def test_same_key_from_midi(self, hist, expected):
+        assert _detect_key(_midi_from_histogram(hist)) == expected
+
+    def test_scale_invariant(self):
+        hist, expected = HISTOGRAMS[0]
+        assert _key_from_histogram(np.array(hist, dtype=float) * 7.5) == expected
+
+    def test_flat_histogram_raises(self):
+        with pytest.raises(RuntimeError):
+            _key_from_histogram(np.ones(12))
+
+    def test_tie_prefers_major_then_lowest_root(self, monkeypatch):
+        profiles = np.zeros((24, 12))
+        profiles[:, 0] = -1.0
+        # A major (row 9), C minor (row 12) and A minor (row 21) all match equally
+        for row in (9, 12, 21):
+            profiles[row, 0] = 1.0
+        monkeypatch.setattr(progression_change, "_KEY_PROFILES", profiles)
+        assert _key_from_histogram(np.eye(12)[0]) == (9, "major", "A major")
+
+    def test_near_tie_within_tolerance(self, monkeypatch):
+        profiles = np.zeros((24, 12))
+        profiles[4, 0] = 1.0
+        profiles[2, 0] = 1.0 - 1e-13
+        monkeypatch.setattr(progression_change, "_KEY_PROFILES", profiles)
+        assert _key_from_histogram(np.eye(12)[0])[:2] == (2, "major")
+
+
+class TestDetectKey:
+
+    def test_empty_midi_raises(self):
+        with pytest.raises(RuntimeError):
+            _detect_key(pretty_midi.PrettyMIDI())
+
+    def test_drums_only_raises(self):
+        with pytest.raises(RuntimeError):
+            _detect_key(_midi_from_histogram(HISTOGRAMS[0][0], is_drum=True))
+
+    def test_drums_ignored(self):
+        hist, expected = HISTOGRAMS[1]
+        midi = _midi_from_histogram(hist)
+        midi.instruments.extend(_midi_from_histogram([5] * 12, is_drum=True).instruments)
+        assert _detect_key(midi) == expected
+
+    def test_saved_melody(self):
+        midi = pretty_midi.PrettyMIDI(os.path.join(SAVED_TRACKS, "Melody.mid"))
+        assert _detect_key(midi) == (5, "major", "F major")
+
+
+class TestKeyCache:
+
+    @pytest.fixture
+    def analyses(self, monkeypatch):
+        calls = []
+        real = progression_change._key_from_histogram
+
+        def counting(hist):
+            calls.append(hist)
+            return real(hist)
+
+        monkeypatch.setattr(progression_change, "_key_from_histogram", counting)
+        monkeypatch.setattr(progression_change, "_key_cache", {})
+        return calls
+
+    def test_unchanged_file_reuses_result(self, tmp_path, analyses):
+        path = str(tmp_path / "track.mid")
+        midi = _midi_from_histogram(HISTOGRAMS[0][0])
+        midi.write(path)
+        assert _detect_key(midi, path) == _detect_key(midi, path) == HISTOGRAMS[0][1]
+        assert len(analyses) == 1
+
+    def test_rewritten_file_is_analyzed_again(self, tmp_path, analyses):
+        path = str(tmp_path / "track.mid")
+        _midi_from_histogram(HISTOGRAMS[0][0]).write(path)
+        _detect_key(pretty_midi.PrettyMIDI(path), path)
+
+        _midi_from_histogram(HISTOGRAMS[1][0]).write(path)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert _detect_key(pretty_midi.PrettyMIDI(path), path) == HISTOGRAMS[1][1]
+        assert len(analyses) == 2
+
+    def test_without_path_nothing_is_cached(self, analyses):
+        midi = _midi_from_histogram(HISTOGRAMS[0][0])
+        _detect_key(midi)
+        _detect_key(midi)
+        assert len(analyses) == 2
+        assert progression_change._key_cache == {}
@@ -0,0 +1,120 @@
+import os
+
+import pretty_midi
+import pytest
+
+from intent.schema import ToolCall, ToolName
+from tools import dispatch
+from tools._result import Unchanged
+from tools.dispatch import MidiSession, dispatch_tool_call
+
+
+def _write_midi(path, pitch=60):
+    midi = pretty_midi.PrettyMIDI()
+    inst = pretty_midi.Instrument(program=0)
+    inst.notes.append(pretty_midi.Note(velocity=100, pitch=pitch, start=0.0, end=1.0))
+    midi.instruments.append(inst)
+    midi.write(str(path))
+    return str(path)
+
+
+def _pitches(path):
+    return [n.pitch for inst in pretty_midi.PrettyMIDI(path).instruments for n in inst.notes]
+
+
+def _shift(target, semitones):
+    return ToolCall(
+        tool=ToolName.pitch_shift,
+        instruction=f"shift {target} by {semitones}",
+        params={"target_description": target, "semitones": semitones},
+    )
+
+
+@pytest.fixture
+def job_dir(tmp_path, monkeypatch):
+    saved = tmp_path / "saved_tracks"
+    saved.mkdir()
+    monkeypatch.setattr(dispatch, "SAVED_TRACKS_DIR", str(saved))
+    job = tmp_path / "job"
+    job.mkdir()
+    return job
+
+
+class TestMidiSession:
+
+    def test_get_parses_once(self, job_dir):
+        path = _write_midi(job_dir / "singing.mid")
+        session = MidiSession()
+        assert session.get(path) is session.get(path)
+
+    def test_edits_stay_in_memory_until_flush(self, job_dir):
+        path = _write_midi(job_dir / "singing.mid")
+        session = MidiSession()
+        dispatch_tool_call(_shift("singing", 2), str(job_dir), session)
+        dispatch_tool_call(_shift("singing", 3), str(job_dir), session)
+        assert _pitches(path) == [60]
+
+        assert session.flush() == []
+        assert _pitches(path) == [65]
+
+    def test_unchanged_result_is_not_written(self, job_dir):
+        path = _write_midi(job_dir / "singing.mid")
+        before = os.stat(path).st_mtime_ns
+        session = MidiSession()
+        dispatch_tool_call(_shift("singing", 0), str(job_dir), session)
+        assert session.flush() == []
+        assert os.stat(path).st_mtime_ns == before
+
+    def test_flush_writes_only_dirty_files_once(self, job_dir, monkeypatch):
+        edited = _write_midi(job_dir / "singing.mid")
+        untouched = _write_midi(job_dir / "humming.mid")
+        written = []
+        real_write = dispatch.atomic_write_midi
+        monkeypatch.setattr(
+            dispatch, "atomic_write_midi",
+            lambda midi, path: (written.append(path), real_write(midi, path)),
+        )
+
+        session = MidiSession()
+        session.get(untouched)
+        dispatch_tool_call(_shift("singing", 1), str(job_dir), session)
+        dispatch_tool_call(_shift("singing", 1), str(job_dir), session)
+        session.flush()
+        session.flush()
+        assert written == [edited]
+
+    def test_failed_write_does_not_stop_others(self, job_dir, monkeypatch):
+        bad = _write_midi(job_dir / "humming.mid")
+        good = _write_midi(job_dir / "singing.mid")
+        real_write = dispatch.atomic_write_midi
+
+        def flaky_write(midi, path):
+            if path == bad:
+                raise OSError("disk full")
+            real_write(midi, path)
+
+        monkeypatch.setattr(dispatch, "atomic_write_midi", flaky_write)
+        session = MidiSession()
+        dispatch_tool_call(_shift("humming", 1), str(job_dir), session)
+        dispatch_tool_call(_shift("singing", 1), str(job_dir), session)
+
+        failures = session.flush()
+        assert [(path, str(exc)) for path, exc in failures] == [(bad, "disk full")]
+        assert _pitches(bad) == [60]
+        assert _pitches(good) == [61]
+        # The failed edit is dropped; the next use rereads the file
+        assert [n.pitch for n in session.get(bad).instruments[0].notes] == [60]
+
+    def test_empty_repeat_is_not_written(self, job_dir):
+        path = str(job_dir / "singing.mid")
+        pretty_midi.PrettyMIDI().write(path)
+        before = os.stat(path).st_mtime_ns
+        session = MidiSession()
+        call = ToolCall(
+            tool=ToolName.repeat_track,
+            instruction="repeat singing",
+            params={"target_description": "singing", "times": 2},
+        )
+        assert isinstance(dispatch_tool_call(call, str(job_dir), session), Unchanged)
+        assert session.flush() == []
+        assert os.stat(path).st_mtime_ns == before
@@ -0,0 +1,142 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from models import GeminiAnalysis, JobStatus, Segment, SegmentType
+from pipeline import orchestrator, stage_score_builder
+from pipeline.orchestrator import _remove_intermediates
+
+
+def _touch(path):
+    with open(path, "wb") as f:
+        f.write(b"x")
+    return str(path)
+
+
+class TestRemoveIntermediates:
+
+    def test_keeps_upload_and_midis(self, tmp_path):
+        upload = _touch(tmp_path / "upload.webm")
+        midi = _touch(tmp_path / "output.mid")
+        mp3 = _touch(tmp_path / "upload.mp3")
+        clip = _touch(tmp_path / "segment_0_singing.wav")
+
+        job = JobStatus(id="job", status="complete")
+        assert _remove_intermediates(job, str(tmp_path), upload_path=upload) == 2
+        assert os.path.exists(upload) and os.path.exists(midi)
+        assert not os.path.exists(mp3) and not os.path.exists(clip)
+
+    def test_clears_deleted_clip_references(self, tmp_path):
+        upload = _touch(tmp_path / "upload.mp3")
+        clip = _touch(tmp_path / "segment_0_singing.wav")
+        speech = _touch(tmp_path / "segment_1_speech.wav")
+        job = JobStatus(
+            id="job",
+            status="complete",
+            segments=[
+                Segment(type=SegmentType.singing, start=0, end=2, audio_clip_path=clip),
+                Segment(type=SegmentType.speech, start=2, end=4, audio_clip_path=speech),
+                Segment(type=SegmentType.silence, start=4, end=5),
+            ],
+            instruction_doc=f'[0.0s - 2.0s | SINGING] [file: {clip}]\n[2.0s - 4.0s | SPEECH]: "louder" [file: {speech}]',
+        )
+
+        _remove_intermediates(job, str(tmp_path), upload_path=upload)
+        assert [seg.audio_clip_path for seg in job.segments] == [None, None, None]
+        assert job.instruction_doc == '[0.0s - 2.0s | SINGING]\n[2.0s - 4.0s | SPEECH]: "louder"'
+
+    def test_keeps_clips_tool_calls_take_as_input(self, tmp_path):
+        upload = _touch(tmp_path / "upload.mp3")
+        clip = _touch(tmp_path / "segment_0_humming.wav")
+        other = _touch(tmp_path / "segment_1_singing.wav")
+        job = JobStatus(
+            id="job",
+            status="complete",
+            segments=[
+                Segment(type=SegmentType.humming, start=0, end=2, audio_clip_path=clip),
+                Segment(type=SegmentType.singing, start=2, end=4, audio_clip_path=other),
+            ],
+            instruction_doc=f"[file: {clip}] [file: {other}]",
+            action_log=[{
+                "tool": "mp3_to_midi",
+                "instruction": "turn the humming into a track",
+                "audio_segment": {"index": 0, "type": "humming", "path": clip},
+                "params": {},
+            }],
+        )
+
+        assert _remove_intermediates(job, str(tmp_path), upload_path=upload) == 1
+        assert os.path.exists(clip) and not os.path.exists(other)
+        assert [seg.audio_clip_path for seg in job.segments] == [clip, None]
+        assert job.instruction_doc == f"[file: {clip}]"
+
+
+class TestPipelineCleanup:
+
+    def test_failed_job_cleans_up(self, tmp_path, monkeypatch):
+        upload = _touch(tmp_path / "upload.mp3")
+        clip = _touch(tmp_path / "segment_0_singing.wav")
+
+        def fail(job_id, path):
+            raise RuntimeError("analysis failed")
+
+        monkeypatch.setattr(orchestrator, "run_gemini_stage", fail)
+        orchestrator.jobs["cleanup-test"] = JobStatus(id="cleanup-test", status="pending")
+        orchestrator.run_pipeline("cleanup-test", upload)
+
+        assert orchestrator.jobs["cleanup-test"].status == "failed"
+        assert os.path.exists(upload)
+        assert not os.path.exists(clip)
+
+
+def _analysis():
+    chord = {"degree": 1, "duration_beats": 4, "instruments": {"piano": [{"s": 0}]}}
+    return GeminiAnalysis.model_validate({
+        "tempo_bpm": 100,
+        "time_signature": [4, 4],
+        "tonality": {"degree": 1, "quality": "M"},
+        "segments": [{"start": 0, "end": 2, "type": "singing", "chords": [chord]}],
+    })
+
+
+@pytest.fixture
+def score_pool():
+    yield
+    orchestrator.shutdown_score_pool()
+
+
+class TestScorePool:
+
+    def test_broken_pool_is_replaced_and_retried(self, tmp_path, monkeypatch, score_pool):
+        calls = []
+
+        def build(analysis, job_dir, executor):
+            calls.append(executor)
+            if len(calls) == 1:
+                raise BrokenProcessPool("worker died")
+            return {"singing": "singing.mid"}
+
+        monkeypatch.setattr(orchestrator, "run_score_builder_stage", build)
+        assert orchestrator._build_scores(_analysis(), str(tmp_path)) == {"singing": "singing.mid"}
+        assert calls[0] is not calls[1]
+        assert orchestrator._get_score_pool() is calls[1]
+
+    def test_second_failure_propagates(self, tmp_path, monkeypatch, score_pool):
+        def build(analysis, job_dir, executor):
+            raise BrokenProcessPool("worker died")
+
+        monkeypatch.setattr(orchestrator, "run_score_builder_stage", build)
+        with pytest.raises(BrokenProcessPool):
+            orchestrator._build_scores(_analysis(), str(tmp_path))
+
+    def test_recovers_after_worker_dies(self, tmp_path, monkeypatch, score_pool):
+        monkeypatch.setenv("MIDI_CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.setattr(stage_score_builder, "MIDI_CACHE_DIR", str(tmp_path / "cache"))
+        pool = orchestrator._get_score_pool()
+        with pytest.raises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+
+        midis = orchestrator._build_scores(_analysis(), str(tmp_path))
+        assert os.path.isfile(midis["singing"])
+        assert orchestrator._get_score_pool() is not pool
@@ -3,6 +3,7 @@
 import os
 import sys
 import json
+import logging
 import uuid
 import shutil
 
@@ -101,4 +102,5 @@ def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from models import GeminiAnalysis
+from pipeline import stage_score_builder
+from pipeline.stage_score_builder import init_score_worker, run_score_builder_stage
+
+
+def _chord(degree):
+    return {"degree": degree, "duration_beats": 4, "instruments": {"piano": [{"s": 0}, {"s": 2}]}}
+
+
+def _analysis(degree=1):
+    return GeminiAnalysis.model_validate({
+        "tempo_bpm": 100,
+        "time_signature": [4, 4],
+        "tonality": {"degree": 1, "quality": "M"},
+        "segments": [
+            {"start": 0, "end": 2, "type": "singing", "chords": [_chord(degree)]},
+            {"start": 2, "end": 4, "type": "speech"},
+        ],
+    })
+
+
+def _worker_has_orchestrator():
+    return "pipeline.orchestrator" in sys.modules
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache = tmp_path / "cache"
+    monkeypatch.setattr(stage_score_builder, "MIDI_CACHE_DIR", str(cache))
+    return cache
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Records the segment types actually rendered (cache misses)."""
+    rendered = []
+    real_render = stage_score_builder._render_type
+
+    def spy(seg_type, *args, **kwargs):
+        rendered.append(seg_type)
+        return real_render(seg_type, *args, **kwargs)
+
+    monkeypatch.setattr(stage_score_builder, "_render_type", spy)
+    return rendered
+
+
+def _job_dir(tmp_path, name):
+    path = tmp_path / name
+    path.mkdir()
+    return str(path)
+
+
+class TestMidiCache:
+
+    def test_miss_then_hit(self, tmp_path, cache_dir, renders):
+        first = run_score_builder_stage(_analysis(), _job_dir(tmp_path, "job1"))
+        assert renders == ["singing"]
+        assert len(os.listdir(cache_dir)) == 1
+
+        second = run_score_builder_stage(_analysis(), _job_dir(tmp_path, "job2"))
+        assert renders == ["singing"]
+        assert _read(first["singing"]) == _read(second["singing"])
+
+    def test_different_score_misses(self, tmp_path, cache_dir, renders):
+        run_score_builder_stage(_analysis(degree=1), _job_dir(tmp_path, "job1"))
+        run_score_builder_stage(_analysis(degree=5), _job_dir(tmp_path, "job2"))
+        assert renders == ["singing", "singing"]
+
+    def test_builder_version_is_part_of_key(self, tmp_path, cache_dir, renders, monkeypatch):
+        run_score_builder_stage(_analysis(), _job_dir(tmp_path, "job1"))
+        monkeypatch.setattr(stage_score_builder, "BUILDER_VERSION", stage_score_builder.BUILDER_VERSION + 1)
+        run_score_builder_stage(_analysis(), _job_dir(tmp_path, "job2"))
+        assert renders == ["singing", "singing"]
+
+    def test_entry_removed_after_lookup_is_a_miss(self, tmp_path, cache_dir, renders):
+        run_score_builder_stage(_analysis(), _job_dir(tmp_path, "job1"))
+        for name in os.listdir(cache_dir):
+            os.remove(cache_dir / name)
+        run_score_builder_stage(_analysis(), _job_dir(tmp_path, "job2"))
+        assert renders == ["singing", "singing"]
+
+    def test_prunes_least_recently_used(self, tmp_path, cache_dir, renders, monkeypatch):
+        monkeypatch.setattr(stage_score_builder, "MIDI_CACHE_MAX_FILES", 2)
+        for i, degree in enumerate((1, 2, 3)):
+            run_score_builder_stage(_analysis(degree), _job_dir(tmp_path, f"job{i}"))
+            # Space the entries out so their ages are distinct
+            for name in os.listdir(cache_dir):
+                path = cache_dir / name
+                os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime - 10))
+        assert len(os.listdir(cache_dir)) == 2
+
+        # degree 1 was the oldest, so it renders again
+        run_score_builder_stage(_analysis(1), _job_dir(tmp_path, "job3"))
+        assert renders == ["singing"] * 4
+
+
+class FailFirstExecutor:
+    """Fails the first submitted render; the rest stay queued."""
+
+    def __init__(self, error):
+        self.error = error
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        if not self.futures:
+            future.set_exception(self.error)
+        self.futures.append(future)
+        return future
+
+
+def _three_types():
+    return GeminiAnalysis.model_validate({
+        "tempo_bpm": 90,
+        "time_signature": [3, 4],
+        "tonality": {"degree": 6, "quality": "m"},
+        "segments": [
+            {"start": 0, "end": 2, "type": "singing", "chords": [_chord(1), _chord(4)]},
+            {"start": 2, "end": 4, "type": "humming", "chords": [_chord(5)]},
+            {"start": 4, "end": 6, "type": "beatboxing", "chords": [_chord(2)]},
+        ],
+    })
+
+
+class TestExecutorFailure:
+
+    @pytest.mark.parametrize("error", [RuntimeError("render failed"), BrokenProcessPool("worker died")])
+    def test_failure_cancels_queued_renders(self, tmp_path, cache_dir, error):
+        executor = FailFirstExecutor(error)
+        with pytest.raises(type(error)):
+            run_score_builder_stage(_three_types(), _job_dir(tmp_path, "job"), executor=executor)
+        assert len(executor.futures) == 3
+        assert all(future.cancelled() for future in executor.futures[1:])
+
+
+class TestProcessPool:
+
+    @pytest.fixture
+    def pool(self, cache_dir, monkeypatch):
+        # Spawned workers read the cache location from the environment
+        monkeypatch.setenv("MIDI_CACHE_DIR", str(cache_dir))
+        executor = ProcessPoolExecutor(
+            max_workers=2,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_score_worker,
+        )
+        yield executor
+        executor.shutdown()
+
+    def test_matches_serial_render(self, tmp_path, cache_dir, pool):
+        analysis = _three_types()
+        pooled = run_score_builder_stage(analysis, _job_dir(tmp_path, "pooled"), executor=pool)
+        assert len(os.listdir(cache_dir)) == 3
+
+        for name in os.listdir(cache_dir):
+            os.remove(cache_dir / name)
+        serial = run_score_builder_stage(analysis, _job_dir(tmp_path, "serial"))
+
+        assert sorted(pooled) == ["beatboxing", "humming", "singing"]
+        for seg_type in pooled:
+            assert _read(pooled[seg_type]) == _read(serial[seg_type])
+
+    def test_orchestrator_workers_do_not_import_orchestrator(self):
+        from pipeline import orchestrator
+
+        try:
+            pool = orchestrator._get_score_pool()
+            assert pool.submit(_worker_has_orchestrator).result() is False
+        finally:
+            orchestrator.shutdown_score_pool()
@@ -0,0 +1,11 @@
+import json
+
+from pipeline.stage_intent import _write_json
+
+
+class TestWriteJson:
+
+    def test_creates_log_dir_on_first_dump(self, tmp_path):
+        path = tmp_path / "log_files" / "action_log_job.json"
+        _write_json(str(path), [{"tool": "pitch_shift"}])
+        assert json.loads(path.read_text()) == [{"tool": "pitch_shift"}]
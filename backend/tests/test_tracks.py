@@ -0,0 +1,164 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import tracks
+from routers.tracks import _etag_matches, _rename_no_clobber
+
+
+@pytest.fixture
+def saved_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracks, "SAVED_TRACKS_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def client(saved_dir):
+    app = FastAPI()
+    app.include_router(tracks.router)
+    return TestClient(app)
+
+
+def _write(path, data=b"MThd"):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class TestEtagMatches:
+
+    @pytest.mark.parametrize("header", [
+        '"abc"',
+        'W/"abc"',
+        '"xyz", "abc"',
+        '"x,y" ,W/"abc"',
+        "*",
+        " * ",
+    ])
+    def test_matches(self, header):
+        assert _etag_matches(header, '"abc"')
+
+    @pytest.mark.parametrize("header", ['"abcd"', '"ab", "c"', "abc", '"x,"abc"', ""])
+    def test_no_match(self, header):
+        assert not _etag_matches(header, '"abc"')
+
+    def test_weak_etag_on_server_side(self):
+        assert _etag_matches('"abc"', 'W/"abc"')
+
+
+class TestListTracks:
+
+    def test_lists_tracks(self, client, saved_dir):
+        for name in ("piano.mid", "drums.mid", ".hidden.mid", "notes.txt"):
+            _write(saved_dir / name)
+        assert client.get("/api/tracks").json() == [
+            {"filename": "drums.mid", "url": "/api/tracks/drums.mid/midi"},
+            {"filename": "piano.mid", "url": "/api/tracks/piano.mid/midi"},
+        ]
+
+    def test_new_track_listed_immediately(self, client, saved_dir):
+        _write(saved_dir / "piano.mid")
+        assert len(client.get("/api/tracks").json()) == 1
+        # Same directory mtime tick as the first save
+        _write(saved_dir / "flute.mid")
+        assert len(client.get("/api/tracks").json()) == 2
+
+
+class TestGetTrack:
+
+    def test_200_with_etag(self, client, saved_dir):
+        _write(saved_dir / "piano.mid")
+        response = client.get("/api/tracks/piano.mid/midi")
+        assert response.status_code == 200
+        assert response.content == b"MThd"
+        assert response.headers["etag"]
+        assert response.headers["cache-control"] == "no-cache"
+
+    @pytest.mark.parametrize("template", ["{}", "W/{}", '"other", {}', "*"])
+    def test_304_when_unchanged(self, client, saved_dir, template):
+        _write(saved_dir / "piano.mid")
+        etag = client.get("/api/tracks/piano.mid/midi").headers["etag"]
+
+        response = client.get("/api/tracks/piano.mid/midi", headers={"If-None-Match": template.format(etag)})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+    def test_200_after_file_changes(self, client, saved_dir):
+        path = saved_dir / "piano.mid"
+        _write(path)
+        etag = client.get("/api/tracks/piano.mid/midi").headers["etag"]
+
+        _write(path, b"MThd-edited")
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        response = client.get("/api/tracks/piano.mid/midi", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.content == b"MThd-edited"
+        assert response.headers["etag"] != etag
+
+    def test_missing_track(self, client, saved_dir):
+        assert client.get("/api/tracks/nope.mid/midi").status_code == 404
+
+
+class TestRenameTrack:
+
+    def test_rename(self, client, saved_dir):
+        _write(saved_dir / "piano.mid", b"piano")
+        response = client.patch("/api/tracks/piano.mid", json={"new_name": "lead"})
+        assert response.status_code == 200
+        assert response.json() == {"filename": "lead.mid", "url": "/api/tracks/lead.mid/midi"}
+        assert not (saved_dir / "piano.mid").exists()
+        assert (saved_dir / "lead.mid").read_bytes() == b"piano"
+
+    def test_existing_target_is_409(self, client, saved_dir):
+        _write(saved_dir / "piano.mid", b"piano")
+        _write(saved_dir / "drums.mid", b"drums")
+        response = client.patch("/api/tracks/piano.mid", json={"new_name": "drums.mid"})
+        assert response.status_code == 409
+        assert (saved_dir / "piano.mid").read_bytes() == b"piano"
+        assert (saved_dir / "drums.mid").read_bytes() == b"drums"
+
+    def test_rename_to_same_name(self, client, saved_dir):
+        _write(saved_dir / "piano.mid")
+        response = client.patch("/api/tracks/piano.mid", json={"new_name": "piano"})
+        assert response.status_code == 200
+        assert (saved_dir / "piano.mid").exists()
+
+    def test_missing_source_is_404(self, client, saved_dir):
+        assert client.patch("/api/tracks/nope.mid", json={"new_name": "x"}).status_code == 404
+
+    def test_traversal_rejected(self, client, saved_dir):
+        _write(saved_dir / "piano.mid")
+        response = client.patch("/api/tracks/piano.mid", json={"new_name": "../escape"})
+        assert response.status_code == 400
+
+
+class TestRenameNoClobber:
+
+    def test_moves_file(self, tmp_path):
+        _write(tmp_path / "a.mid", b"a")
+        _rename_no_clobber(str(tmp_path / "a.mid"), str(tmp_path / "b.mid"))
+        assert not (tmp_path / "a.mid").exists()
+        assert (tmp_path / "b.mid").read_bytes() == b"a"
+
+    def test_existing_target_raises(self, tmp_path):
+        _write(tmp_path / "a.mid", b"a")
+        _write(tmp_path / "b.mid", b"b")
+        with pytest.raises(FileExistsError):
+            _rename_no_clobber(str(tmp_path / "a.mid"), str(tmp_path / "b.mid"))
+        assert (tmp_path / "a.mid").read_bytes() == b"a"
+        assert (tmp_path / "b.mid").read_bytes() == b"b"
+
+    def test_without_hard_links(self, tmp_path, monkeypatch):
+        def no_link(src, dst):
+            raise PermissionError("links not supported")
+
+        monkeypatch.setattr(os, "link", no_link)
+        _write(tmp_path / "a.mid", b"a")
+        _write(tmp_path / "c.mid", b"c")
+        with pytest.raises(FileExistsError):
+            _rename_no_clobber(str(tmp_path / "a.mid"), str(tmp_path / "c.mid"))
+        _rename_no_clobber(str(tmp_path / "a.mid"), str(tmp_path / "b.mid"))
+        assert (tmp_path / "b.mid").read_bytes() == b"a"
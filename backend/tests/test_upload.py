@@ -0,0 +1,98 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from models import JobStatus
+from routers import upload
+
+
+class FakeExecutor:
+    """Records submitted pipelines instead of running them."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append((fn.__name__, args))
+
+
+class FakeJobs(dict):
+    """A dict standing in for the JobStore."""
+
+    def save(self, job):
+        self[job.id] = job
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "MAX_FILE_SIZE", 1024)
+    monkeypatch.setattr(upload, "MULTIPART_OVERHEAD", 512)
+    monkeypatch.setattr(upload, "UPLOAD_CHUNK_SIZE", 256)
+    return tmp_path
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    fake = FakeExecutor()
+    monkeypatch.setattr(upload, "_executor", fake)
+    return fake
+
+
+@pytest.fixture
+def client(jobs_dir, executor):
+    app = FastAPI()
+    app.add_middleware(upload.UploadSizeLimitMiddleware)
+    app.include_router(upload.router)
+    return TestClient(app)
+
+
+def _post(client, url, size, name="take.mp3"):
+    return client.post(url, files={"file": (name, b"x" * size, "audio/mpeg")})
+
+
+class TestUpload:
+
+    def test_accepts_file_within_limit(self, client, jobs_dir, executor):
+        response = _post(client, "/api/upload", 1024)
+        assert response.status_code == 200
+        job_id = response.json()["job_id"]
+        assert os.path.getsize(jobs_dir / job_id / "input.mp3") == 1024
+        assert executor.submitted == [("run_pipeline", (job_id, str(jobs_dir / job_id / "input.mp3")))]
+
+    def test_declared_oversize_rejected_before_body(self, client, jobs_dir, executor):
+        response = _post(client, "/api/upload", 4096)
+        assert response.status_code == 413
+        assert response.json()["detail"].startswith("File too large")
+        assert os.listdir(jobs_dir) == []
+        assert executor.submitted == []
+
+    def test_oversize_within_overhead_rejected_while_copying(self, client, jobs_dir, executor):
+        # Passes the Content-Length check, then crosses MAX_FILE_SIZE mid-copy
+        response = _post(client, "/api/upload", 1100)
+        assert response.status_code == 413
+        assert os.listdir(jobs_dir) == []
+        assert executor.submitted == []
+
+    def test_unsupported_type(self, client, jobs_dir, executor):
+        response = _post(client, "/api/upload", 10, name="take.wav")
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Unsupported file type: .wav. Allowed: MP3, WebM."
+        assert os.listdir(jobs_dir) == []
+
+    def test_standalone_edit_oversize_removes_job_dir(self, client, jobs_dir, executor):
+        response = _post(client, "/api/edit", 1100)
+        assert response.status_code == 413
+        assert os.listdir(jobs_dir) == []
+
+    def test_job_edit_oversize_keeps_job_dir(self, client, jobs_dir, executor, monkeypatch):
+        monkeypatch.setattr(upload, "jobs", FakeJobs(job1=JobStatus(id="job1", status="complete")))
+        (jobs_dir / "job1").mkdir()
+        (jobs_dir / "job1" / "output.mid").write_bytes(b"MThd")
+
+        response = _post(client, "/api/jobs/job1/edit", 1100)
+        assert response.status_code == 413
+        assert os.listdir(jobs_dir / "job1") == ["output.mid"]
+        assert executor.submitted == []
@@ -0,0 +1,61 @@
+# Atomic MIDI writes, and the parse cache they keep warm, shared by the
+# MIDI-editing tools and the dispatcher.
+import copy
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pretty_midi
+
+# Last few MIDIs written, by absolute path, with the (inode, mtime_ns, size)
+# of the file they were written to; any other change to the file misses
+MIDI_CACHE_SIZE = 4
+_midi_cache: OrderedDict[str, tuple[tuple[int, int, int], pretty_midi.PrettyMIDI]] = OrderedDict()
+_midi_cache_lock = threading.Lock()
+
+
+def _file_signature(path: str) -> tuple[int, int, int]:
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def load_midi(midi_path: str) -> pretty_midi.PrettyMIDI:
+    """Parse midi_path, or copy the MIDI last written there if the file is unchanged.
+
+    Copying a cached PrettyMIDI is cheaper than re-decoding the file, so a
+    tool run on the output of the previous one skips the parse. The caller
+    always gets its own object to edit.
+    """
+    key = os.path.abspath(midi_path)
+    with _midi_cache_lock:
+        entry = _midi_cache.get(key)
+    if entry is not None and entry[0] == _file_signature(key):
+        return copy.deepcopy(entry[1])
+    return pretty_midi.PrettyMIDI(midi_path)
+
+
+def atomic_write_midi(midi: pretty_midi.PrettyMIDI, midi_path: str) -> None:
+    """Replace midi_path with midi, so readers never see a half-written file.
+
+    Writes to a temp file in the same directory, through the descriptor
+    mkstemp opened, then renames it over the target. midi is then kept as
+    the cached parse of midi_path, so the caller must not edit it afterwards.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".mid", dir=os.path.dirname(midi_path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            midi.write(f)
+        os.replace(tmp_path, midi_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    key = os.path.abspath(midi_path)
+    signature = _file_signature(key)
+    with _midi_cache_lock:
+        _midi_cache[key] = (signature, midi)
+        _midi_cache.move_to_end(key)
+        if len(_midi_cache) > MIDI_CACHE_SIZE:
+            _midi_cache.popitem(last=False)
@@ -0,0 +1,8 @@
+# Tool summaries shared by the MIDI-editing tools and the dispatcher.
+
+class Unchanged(str):
+    """A tool summary for a call that left the MIDI untouched.
+
+    It reads like any other summary string; the dispatcher checks for it to
+    skip writing the file back.
+    """
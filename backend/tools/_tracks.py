@@ -0,0 +1,27 @@
+# Track matching shared by the MIDI-editing tools.
+import pretty_midi
+
+
+def find_tracks(
+    midi: pretty_midi.PrettyMIDI, description: str, include_drums: bool = False
+) -> list[pretty_midi.Instrument]:
+    """Fuzzy-match a target_description against instrument/track names.
+
+    If no name-based match is found, falls back to all instruments — only the
+    non-drum ones unless include_drums is set (the file-level resolution in
+    dispatch.py already picked the right MIDI).
+    """
+    if description:
+        desc_lower = description.strip().lower()
+        # Lower-case each instrument name once, then test it against the description
+        names = [((inst.name or "").strip().lower(), inst) for inst in midi.instruments]
+        matched = [
+            inst for name, inst in names
+            if name and (name in desc_lower or desc_lower in name)
+        ]
+        if matched:
+            return matched
+
+    if include_drums:
+        return list(midi.instruments)
+    return [inst for inst in midi.instruments if not inst.is_drum]
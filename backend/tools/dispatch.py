@@ -1,29 +1,102 @@
 # Tool dispatcher — routes a ToolCall to the correct tool function.
 from __future__ import annotations
 
+import logging
 import os
-import glob
 import shutil
+from functools import lru_cache
+from typing import Callable
+
+import pretty_midi
 
 from intent.schema import ToolCall, ToolName
+from paths import SAVED_TRACKS_DIR, list_midi_files
+from tools._atomic import atomic_write_midi, load_midi
+from tools._result import Unchanged
 from tools.pitch_shift import run_pitch_shift
 from tools.progression_change import run_progression_change
 from tools.switch_instrument import run_switch_instrument
 from tools.repeat_track import run_repeat_track
 
+logger = logging.getLogger(__name__)
+
+# Tools that edit an existing MIDI file: resolve the file, then run the tool on it.
+# Each takes (tool_call, midi_path, midi=None) and returns a summary string.
+_TOOL_RUNNERS: dict[ToolName, Callable[..., str]] = {
+    ToolName.pitch_shift: run_pitch_shift,
+    ToolName.progression_change: run_progression_change,
+    ToolName.switch_instrument: run_switch_instrument,
+    ToolName.repeat_track: run_repeat_track,
+}
+
+
+# Filler words that never identify a track
+_STOP_WORDS = frozenset({"the", "a", "an", "track", "my", "that", "this"})
 
-# Default location for user's saved tracks
-_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-SAVED_TRACKS_DIR = os.path.join(_BACKEND_DIR, "saved_tracks")
+
+@lru_cache(maxsize=64)
+def _description_words(description: str) -> frozenset[str]:
+    """Significant words of a target description."""
+    return frozenset(w for w in description.split() if w not in _STOP_WORDS and len(w) > 1)
+
+
+@lru_cache(maxsize=256)
+def _name_words(filename: str) -> frozenset[str]:
+    """Words of a track filename, split on spaces, underscores and hyphens."""
+    parts = filename.replace("_", " ").replace("-", " ").split()
+    # Single characters can never match a description word
+    return frozenset(w for w in parts if len(w) > 1)
 
 
 def _words_overlap(description: str, filename: str) -> bool:
     """Check if any significant word in the description matches the filename."""
-    stop_words = {"the", "a", "an", "track", "my", "that", "this"}
-    # Split both into words, compare
-    desc_words = {w for w in description.split() if w not in stop_words and len(w) > 1}
-    name_parts = set(filename.replace("_", " ").replace("-", " ").split())
-    return bool(desc_words & name_parts)
+    return not _description_words(description).isdisjoint(_name_words(filename))
+
+
+class MidiSession:
+    """Parsed MIDI files shared by the tool calls of one dispatch loop.
+
+    Each file is parsed once and tools edit the in-memory PrettyMIDI. Edited
+    files are only written back, atomically and once each, by flush(), which
+    hands the written copies over to the load_midi cache.
+    """
+
+    def __init__(self) -> None:
+        self._midis: dict[str, pretty_midi.PrettyMIDI] = {}
+        self._dirty: set[str] = set()
+
+    def get(self, midi_path: str) -> pretty_midi.PrettyMIDI:
+        """Return the parsed MIDI at midi_path, parsing it on first use."""
+        midi = self._midis.get(midi_path)
+        if midi is None:
+            midi = self._midis[midi_path] = load_midi(midi_path)
+        return midi
+
+    def mark_dirty(self, midi_path: str) -> None:
+        self._dirty.add(midi_path)
+
+    def flush(self) -> list[tuple[str, Exception]]:
+        """Write back every edited file.
+
+        Each file is written on its own, so one failed write does not stop the
+        rest. Returns (path, error) for each file that could not be written;
+        its edits are dropped and the file on disk is left as it was.
+        """
+        failures: list[tuple[str, Exception]] = []
+        for path in sorted(self._dirty):
+            # Written copies now belong to the cache; reload on next use
+            midi = self._midis.pop(path)
+            try:
+                atomic_write_midi(midi, path)
+            except Exception as exc:
+                failures.append((path, exc))
+        self._dirty.clear()
+        return failures
+
+
+def _list_mids(directory: str) -> list[str]:
+    """Return the sorted paths of the .mid files in directory ([] if it is missing)."""
+    return [os.path.join(directory, name) for name in list_midi_files(directory)]
 
 
 def resolve_midi_path(tool_call: ToolCall, job_dir: str) -> str:
@@ -36,82 +109,77 @@ def resolve_midi_path(tool_call: ToolCall, job_dir: str) -> str:
     """
     target = (tool_call.params.get("target_description") or "").strip().lower()
 
+    # Each directory is listed once and reused by the fallbacks below
+    saved = _list_mids(SAVED_TRACKS_DIR)
+    job_mids = _list_mids(job_dir)
+
     # 1. Check saved_tracks/ — return path directly so tools modify in place
-    if os.path.isdir(SAVED_TRACKS_DIR):
-        saved = sorted(glob.glob(os.path.join(SAVED_TRACKS_DIR, "*.mid")))
-        if target:
-            # Match by name when a target is specified
-            for path in saved:
-                name = os.path.splitext(os.path.basename(path))[0].lower()
-                if name in target or target in name or _words_overlap(target, name):
-                    return path
-        elif len(saved) == 1:
-            # Only one track — use it
-            return saved[0]
-        elif saved:
-            # Multiple tracks, no target — fall through to let tool pick
-            # but if nothing else matches below, use first saved track
-            pass
+    if target:
+        # Match by name when a target is specified
+        for path in saved:
+            name = os.path.splitext(os.path.basename(path))[0].lower()
+            if name in target or target in name or _words_overlap(target, name):
+                return path
+    elif len(saved) == 1:
+        # Only one track — use it
+        return saved[0]
+    # Multiple tracks, no target — fall through to let tool pick,
+    # but if nothing else matches below, use first saved track
 
     # 2. Check for per-type MIDIs in job dir that match the description
     if target:
-        for path in glob.glob(os.path.join(job_dir, "*.mid")):
+        for path in job_mids:
             name = os.path.splitext(os.path.basename(path))[0].lower()
             if name in target or target in name or _words_overlap(target, name):
                 return path
 
     # 3. Check for output.mid in job dir
     output_mid = os.path.join(job_dir, "output.mid")
-    if os.path.isfile(output_mid):
+    if output_mid in job_mids:
         return output_mid
 
     # 4. Fallback: first .mid in job dir
-    mids = sorted(glob.glob(os.path.join(job_dir, "*.mid")))
-    if mids:
-        return mids[0]
+    if job_mids:
+        return job_mids[0]
 
     # 5. Fallback: first .mid in saved_tracks/
-    if os.path.isdir(SAVED_TRACKS_DIR):
-        saved = sorted(glob.glob(os.path.join(SAVED_TRACKS_DIR, "*.mid")))
-        if saved:
-            return saved[0]
+    if saved:
+        return saved[0]
 
     raise FileNotFoundError(
         f"No MIDI file found for target {target!r} in saved_tracks/ or {job_dir}"
     )
 
 
-def dispatch_tool_call(tool_call: ToolCall, job_dir: str) -> str:
+def dispatch_tool_call(
+    tool_call: ToolCall, job_dir: str, session: MidiSession | None = None
+) -> str:
     """Route a single ToolCall to the appropriate tool function.
 
     Args:
         tool_call: The parsed and normalized ToolCall from the intent stage.
         job_dir: Path to the current job's working directory.
+        session: Optional MidiSession shared across a batch of calls, so a
+            file targeted by several calls is parsed and written only once.
+            The caller must flush() it after the batch.
 
     Returns:
         A summary string from the tool describing what it did.
     """
     tag = f"[dispatch]"
 
-    if tool_call.tool == ToolName.pitch_shift:
-        midi_path = resolve_midi_path(tool_call, job_dir)
-        print(f"{tag} pitch_shift → {midi_path}")
-        return run_pitch_shift(tool_call, midi_path)
-
-    if tool_call.tool == ToolName.progression_change:
-        midi_path = resolve_midi_path(tool_call, job_dir)
-        print(f"{tag} progression_change → {midi_path}")
-        return run_progression_change(tool_call, midi_path)
-
-    if tool_call.tool == ToolName.switch_instrument:
-        midi_path = resolve_midi_path(tool_call, job_dir)
-        print(f"{tag} switch_instrument → {midi_path}")
-        return run_switch_instrument(tool_call, midi_path)
-
-    if tool_call.tool == ToolName.repeat_track:
+    runner = _TOOL_RUNNERS.get(tool_call.tool)
+    if runner is not None:
         midi_path = resolve_midi_path(tool_call, job_dir)
-        print(f"{tag} repeat_track → {midi_path}")
-        return run_repeat_track(tool_call, midi_path)
+        logger.info(f"{tag} {tool_call.tool.value} → {midi_path}")
+        if session is None:
+            return runner(tool_call, midi_path)
+
+        # Tools validate before they mutate, so a failed call leaves the copy intact
+        summary = runner(tool_call, midi_path, session.get(midi_path))
+        if not isinstance(summary, Unchanged):
+            session.mark_dirty(midi_path)
+        return summary
 
     # TODO: wire up remaining tools
     # if tool_call.tool == ToolName.mp3_to_midi:
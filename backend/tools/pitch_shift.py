@@ -1,37 +1,24 @@
 # pitch_shift — Transpose a track up or down by N semitones.
+import logging
 import os
-import tempfile
+
+import numpy as np
 import pretty_midi
 
 from intent.schema import ToolCall
+from tools._atomic import atomic_write_midi, load_midi
+from tools._result import Unchanged
+from tools._tracks import find_tracks
+
+logger = logging.getLogger(__name__)
 
 MIDI_NOTE_MIN = 0
 MIDI_NOTE_MAX = 127
 
 
-def _find_tracks(midi: pretty_midi.PrettyMIDI, description: str) -> list[pretty_midi.Instrument]:
-    """Fuzzy-match a target_description against instrument/track names.
-
-    If no name-based match is found, falls back to all non-drum instruments
-    (the file-level resolution in dispatch.py already picked the right MIDI).
-    """
-    non_drum = [inst for inst in midi.instruments if not inst.is_drum]
-
-    if not description:
-        return non_drum
-
-    desc_lower = description.strip().lower()
-    matched = []
-    for inst in midi.instruments:
-        name = (inst.name or "").strip().lower()
-        if name and (name in desc_lower or desc_lower in name):
-            matched.append(inst)
-
-    # Fall back to all non-drum tracks — dispatch already resolved the file
-    return matched if matched else non_drum
-
-
-def run_pitch_shift(tool_call: ToolCall, midi_path: str) -> str:
+def run_pitch_shift(
+    tool_call: ToolCall, midi_path: str, midi: pretty_midi.PrettyMIDI | None = None
+) -> str:
     """Apply pitch shift from a ToolCall to the MIDI file at midi_path.
 
     Reads tool_call.params for:
@@ -39,6 +26,8 @@ def run_pitch_shift(tool_call: ToolCall, midi_path: str) -> str:
         target_description (str, optional): Which track to shift.
 
     Modifies the MIDI file in-place (atomic write) and returns a summary string.
+    If midi is given, edits that already-parsed copy of midi_path instead and
+    leaves writing it back to the caller.
     """
     tag = "[pitch_shift]"
 
@@ -49,11 +38,13 @@ def run_pitch_shift(tool_call: ToolCall, midi_path: str) -> str:
     target = tool_call.params.get("target_description", "")
 
     if semitones == 0:
-        return "No pitch change requested (semitones=0)."
+        return Unchanged("No pitch change requested (semitones=0).")
 
-    midi = pretty_midi.PrettyMIDI(midi_path)
+    owns_midi = midi is None
+    if owns_midi:
+        midi = load_midi(midi_path)
 
-    matched = _find_tracks(midi, target)
+    matched = find_tracks(midi, target)
     if not matched:
         available = [inst.name for inst in midi.instruments if inst.name]
         raise ValueError(
@@ -62,32 +53,36 @@ def run_pitch_shift(tool_call: ToolCall, midi_path: str) -> str:
 
     total_shifted = 0
     total_clamped = 0
+    total_moved = 0
 
     for inst in matched:
-        for note in inst.notes:
-            new_pitch = note.pitch + semitones
+        notes = inst.notes
+        if not notes:
+            continue
+
+        # Shift and clamp the whole track in one vector op, then scatter back
+        pitches = np.fromiter((note.pitch for note in notes), dtype=np.int32, count=len(notes))
+        shifted = pitches + semitones
+        clamped = np.clip(shifted, MIDI_NOTE_MIN, MIDI_NOTE_MAX)
+        total_clamped += int(np.count_nonzero(clamped != shifted))
+        moved = int(np.count_nonzero(clamped != pitches))
+        total_shifted += len(notes)
+        if not moved:
+            continue
+
+        for note, new_pitch in zip(notes, clamped.tolist()):
+            note.pitch = new_pitch
+        total_moved += moved
 
-            if new_pitch < MIDI_NOTE_MIN:
-                new_pitch = MIDI_NOTE_MIN
-                total_clamped += 1
-            elif new_pitch > MIDI_NOTE_MAX:
-                new_pitch = MIDI_NOTE_MAX
-                total_clamped += 1
+    # Every note was already pinned at the edge of the range: nothing to write
+    if not total_moved:
+        summary = "No change: every note is already at the edge of the MIDI range."
+        logger.info(f"{tag} {summary}")
+        return Unchanged(summary)
 
-            note.pitch = new_pitch
-            total_shifted += 1
-
-    # Atomic write
-    dir_name = os.path.dirname(midi_path)
-    fd, tmp_path = tempfile.mkstemp(suffix=".mid", dir=dir_name)
-    os.close(fd)
-    try:
-        midi.write(tmp_path)
-        os.replace(tmp_path, midi_path)
-    except Exception:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
-        raise
+    # Atomic write (a caller that passed midi in writes it back itself)
+    if owns_midi:
+        atomic_write_midi(midi, midi_path)
 
     direction = "up" if semitones > 0 else "down"
     summary = (
@@ -97,5 +92,5 @@ def run_pitch_shift(tool_call: ToolCall, midi_path: str) -> str:
     if total_clamped:
         summary += f" ({total_clamped} notes clamped to MIDI range 0-127.)"
 
-    print(f"{tag} {summary}")
+    logger.info(f"{tag} {summary}")
     return summary
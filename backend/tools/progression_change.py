@@ -1,11 +1,18 @@
 # progression_change — Change the key/scale of a track.
+import logging
 import os
-import tempfile
+import threading
+from functools import lru_cache
 
-import music21
+import numpy as np
 import pretty_midi
 
 from intent.schema import ToolCall
+from tools._atomic import atomic_write_midi, load_midi
+from tools._result import Unchanged
+from tools._tracks import find_tracks
+
+logger = logging.getLogger(__name__)
 
 MIDI_NOTE_MIN = 0
 MIDI_NOTE_MAX = 127
@@ -16,6 +23,8 @@ _PITCH_CLASS = {
     "E": 4, "F": 5, "F#": 6, "G-": 6, "G": 7, "G#": 8,
     "A-": 8, "A": 9, "A#": 10, "B-": 10, "B": 11,
 }
+# Case-folded once so user-supplied roots ("f# minor") need no per-call normalization
+_PITCH_CLASS_LOWER = {name.lower(): pc for name, pc in _PITCH_CLASS.items()}
 
 # Scale intervals (semitones from root)
 _SCALE_INTERVALS = {
@@ -23,7 +32,42 @@ _SCALE_INTERVALS = {
     "minor": [0, 2, 3, 5, 7, 8, 10],
 }
 
+# Tonic spelling used when reporting a detected key, by mode
+_KEY_TONIC_NAMES = {
+    "major": ["C", "C#", "D", "E-", "E", "F", "F#", "G", "A-", "A", "B-", "B"],
+    "minor": ["C", "C#", "D", "E-", "E", "F", "F#", "G", "G#", "A", "B-", "B"],
+}
+
+# Aarden-Essen key profiles (weight of each scale degree above the tonic)
+_KEY_MODES = ("major", "minor")
+_KEY_WEIGHTS = {
+    "major": [17.7661, 0.145624, 14.9265, 0.160186, 19.8049, 11.3587,
+              0.291248, 22.062, 0.145624, 8.15494, 0.232998, 4.95122],
+    "minor": [18.2648, 0.737619, 14.0499, 16.8599, 0.702494, 14.4362,
+              0.702494, 18.6161, 4.56621, 1.93186, 7.37619, 1.75623],
+}
+
+
+def _build_key_profiles() -> np.ndarray:
+    """Rows 0-11 are major keys on C..B, rows 12-23 minor; each row centred and unit-length."""
+    rows = [np.roll(_KEY_WEIGHTS[mode], root) for mode in _KEY_MODES for root in range(12)]
+    profiles = np.array(rows)
+    profiles -= profiles.mean(axis=1, keepdims=True)
+    profiles /= np.linalg.norm(profiles, axis=1, keepdims=True)
+    return profiles
+
+
+_KEY_PROFILES = _build_key_profiles()
+# Correlations closer than this to the best one count as a tie
+_KEY_TIE_TOLERANCE = 1e-9
+
+# Detected keys by (path, mtime_ns, size); any rewrite of the file misses the cache
+_KEY_CACHE_MAX = 128
+_key_cache: dict[tuple[str, int, int], tuple[int, str, str]] = {}
+_key_cache_lock = threading.Lock()
 
+
+@lru_cache(maxsize=64)
 def _parse_scale_name(name: str) -> tuple[int, str]:
     """Parse a scale name like 'A minor' or 'F# major' into (root_pc, mode)."""
     parts = name.strip().split()
@@ -38,7 +82,7 @@ def _parse_scale_name(name: str) -> tuple[int, str]:
     if mode not in _SCALE_INTERVALS:
         raise ValueError(f"Unsupported mode: {mode!r}. Use 'major' or 'minor'.")
 
-    pc = _PITCH_CLASS.get(root_name)
+    pc = _PITCH_CLASS_LOWER.get(root_name.lower())
     if pc is None:
         raise ValueError(
             f"Unknown root note: {root_name!r}. "
@@ -48,74 +92,113 @@ def _parse_scale_name(name: str) -> tuple[int, str]:
     return pc, mode
 
 
-def _detect_key(midi_path: str) -> tuple[int, str, str]:
-    """Detect the key of a MIDI file using music21's Krumhansl-Schmuckler algorithm."""
-    score = music21.converter.parse(midi_path)
-    key = score.analyze("key")
-    if key is None:
-        raise RuntimeError("music21 could not detect a key from this MIDI file.")
-
-    root_name = key.tonic.name
-    mode = key.mode
-
-    pc = _PITCH_CLASS.get(root_name)
-    if pc is None:
-        raise RuntimeError(f"music21 returned unexpected tonic: {root_name!r}")
-
-    return pc, mode, f"{root_name} {mode}"
-
+def _detect_key(midi: pretty_midi.PrettyMIDI, midi_path: str | None = None) -> tuple[int, str, str]:
+    """Detect the key of a parsed MIDI with the Krumhansl-Schmuckler algorithm.
 
-def _find_tracks(midi: pretty_midi.PrettyMIDI, description: str) -> list[pretty_midi.Instrument]:
-    """Fuzzy-match a target_description against instrument/track names.
-
-    Falls back to all non-drum instruments if no match found.
+    Works from the notes already parsed for editing, so the file is never
+    parsed a second time. Pass midi_path only when midi is exactly that
+    file's content: the result is then reused while the file is unchanged.
     """
-    non_drum = [inst for inst in midi.instruments if not inst.is_drum]
-
-    if not description:
-        return non_drum
-
-    desc_lower = description.strip().lower()
-    matched = []
-    for inst in midi.instruments:
-        name = (inst.name or "").strip().lower()
-        if name and (name in desc_lower or desc_lower in name):
-            matched.append(inst)
+    cache_key = None
+    if midi_path is not None:
+        st = os.stat(midi_path)
+        cache_key = (midi_path, st.st_mtime_ns, st.st_size)
+        with _key_cache_lock:
+            cached = _key_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    notes = [note for inst in midi.instruments if not inst.is_drum for note in inst.notes]
+    if not notes:
+        raise RuntimeError("Could not detect a key: the MIDI has no pitched notes.")
+
+    pitch_classes = np.fromiter((note.pitch % 12 for note in notes), dtype=np.int64, count=len(notes))
+    durations = np.fromiter((note.end - note.start for note in notes), dtype=np.float64, count=len(notes))
+    result = _key_from_histogram(np.bincount(pitch_classes, weights=durations, minlength=12))
+
+    if cache_key is not None:
+        with _key_cache_lock:
+            if len(_key_cache) >= _KEY_CACHE_MAX:
+                _key_cache.pop(next(iter(_key_cache)))
+            _key_cache[cache_key] = result
+    return result
+
+
+def _key_from_histogram(hist: np.ndarray) -> tuple[int, str, str]:
+    """Pick the key whose profile correlates best with a 12-bin pitch-class histogram.
+
+    Keys that tie (within floating-point noise) resolve to major before
+    minor, then to the lowest root, so the result never depends on rounding.
+    """
+    hist = np.asarray(hist, dtype=np.float64) - np.mean(hist)
+    hist_norm = np.sqrt(hist @ hist)
+    if hist_norm == 0:
+        raise RuntimeError("Could not detect a key: the notes have no pitch-class profile.")
 
-    return matched if matched else non_drum
+    # Pearson correlation against each of the 24 candidate keys
+    scores = _KEY_PROFILES @ hist / hist_norm
+    best = int(np.flatnonzero(scores >= scores.max() - _KEY_TIE_TOLERANCE)[0])
+    root, mode = best % 12, _KEY_MODES[best // 12]
+    root_name = _KEY_TONIC_NAMES[mode][root]
+    return root, mode, f"{root_name} {mode}"
 
 
 def _remap_note(
     pitch: int,
     src_root: int,
-    src_intervals: list[int],
+    src_degrees: dict[int, int],
     dst_root: int,
     dst_intervals: list[int],
 ) -> int:
-    """Re-map a single MIDI pitch from source scale to destination scale."""
+    """Re-map a single MIDI pitch from source scale to destination scale.
+
+    src_degrees maps each source-scale interval to its degree index.
+    """
     rel = (pitch - src_root) % 12
     octave_offset = (pitch - src_root) // 12
 
-    if rel in src_intervals:
-        degree_idx = src_intervals.index(rel)
-        new_rel = dst_intervals[degree_idx]
-    else:
+    degree_idx = src_degrees.get(rel)
+    if degree_idx is None:
         root_delta = dst_root - src_root
         return max(MIDI_NOTE_MIN, min(MIDI_NOTE_MAX, pitch + root_delta))
 
-    new_pitch = dst_root + octave_offset * 12 + new_rel
+    new_pitch = dst_root + octave_offset * 12 + dst_intervals[degree_idx]
     return max(MIDI_NOTE_MIN, min(MIDI_NOTE_MAX, new_pitch))
 
 
-def run_progression_change(tool_call: ToolCall, midi_path: str) -> str:
+# Bounded by the 12 x 2 x 12 x 2 possible key pairs, so every table is kept
+@lru_cache(maxsize=None)
+def _build_remap_lut(src_root: int, src_mode: str, dst_root: int, dst_mode: str) -> np.ndarray:
+    """Tabulate _remap_note over every MIDI pitch: lut[pitch] -> remapped pitch.
+
+    The table is shared between calls, so it is returned read-only.
+    """
+    src_degrees = {interval: i for i, interval in enumerate(_SCALE_INTERVALS[src_mode])}
+    dst_intervals = _SCALE_INTERVALS[dst_mode]
+    lut = np.array(
+        [
+            _remap_note(pitch, src_root, src_degrees, dst_root, dst_intervals)
+            for pitch in range(MIDI_NOTE_MAX + 1)
+        ],
+        dtype=np.int16,
+    )
+    lut.flags.writeable = False
+    return lut
+
+
+def run_progression_change(
+    tool_call: ToolCall, midi_path: str, midi: pretty_midi.PrettyMIDI | None = None
+) -> str:
     """Change the key/scale of a MIDI file.
 
     Reads tool_call.params for:
         progression (str): Target scale name, e.g. "A minor", "D major".
         target_description (str, optional): Which track to change.
 
-    Auto-detects the current key using music21, then remaps notes to the
-    target scale. Modifies the MIDI file in-place (atomic write).
+    Auto-detects the current key from the notes, then remaps them to the
+    target scale. Modifies the MIDI file in-place (atomic write). If midi is
+    given, edits that already-parsed copy of midi_path instead and leaves
+    writing it back to the caller.
     """
     tag = "[progression_change]"
 
@@ -130,60 +213,66 @@ def run_progression_change(tool_call: ToolCall, midi_path: str) -> str:
 
     # Parse target scale
     dst_root, dst_mode = _parse_scale_name(str(target_scale))
-    dst_intervals = _SCALE_INTERVALS[dst_mode]
     dst_name = str(target_scale).strip()
 
-    # Detect current key
-    src_root, src_mode, src_name = _detect_key(midi_path)
-    src_intervals = _SCALE_INTERVALS[src_mode]
+    # Load MIDI, then detect the current key from it
+    owns_midi = midi is None
+    if owns_midi:
+        midi = load_midi(midi_path)
 
-    if src_root == dst_root and src_mode == dst_mode:
-        return f"Already in {src_name}, no changes needed."
+    # A passed-in copy may carry unsaved edits, so only a fresh load is keyed by the file
+    src_root, src_mode, src_name = _detect_key(midi, midi_path if owns_midi else None)
 
-    # Load MIDI
-    midi = pretty_midi.PrettyMIDI(midi_path)
+    if src_root == dst_root and src_mode == dst_mode:
+        return Unchanged(f"Already in {src_name}, no changes needed.")
 
-    matched = _find_tracks(midi, target)
+    matched = find_tracks(midi, target)
     if not matched:
         available = [inst.name for inst in midi.instruments if inst.name]
         raise ValueError(f"No tracks matching {target!r}. Available: {available}")
 
     same_mode = src_mode == dst_mode
     root_delta = dst_root - src_root
+    # Remapping is a pure function of the pitch, tabulated once per key pair
+    remap_lut = None if same_mode else _build_remap_lut(src_root, src_mode, dst_root, dst_mode)
 
     total_changed = 0
     total_clamped = 0
+    total_moved = 0
 
     for inst in matched:
-        if inst.is_drum:
+        notes = inst.notes
+        if inst.is_drum or not notes:
             continue
 
-        for note in inst.notes:
-            if same_mode:
-                new_pitch = note.pitch + root_delta
-            else:
-                new_pitch = _remap_note(
-                    note.pitch, src_root, src_intervals, dst_root, dst_intervals
-                )
-
-            if new_pitch < MIDI_NOTE_MIN or new_pitch > MIDI_NOTE_MAX:
-                new_pitch = max(MIDI_NOTE_MIN, min(MIDI_NOTE_MAX, new_pitch))
-                total_clamped += 1
+        pitches = np.fromiter((note.pitch for note in notes), dtype=np.int32, count=len(notes))
+        if same_mode:
+            # Plain transposition: shift and clamp the whole track in one vector op
+            shifted = pitches + root_delta
+            clamped = np.clip(shifted, MIDI_NOTE_MIN, MIDI_NOTE_MAX)
+            total_clamped += int(np.count_nonzero(clamped != shifted))
+            new_pitches = clamped
+        else:
+            # The table is already clamped to the MIDI range
+            new_pitches = remap_lut[pitches]
+        total_changed += len(notes)
+        moved = int(np.count_nonzero(new_pitches != pitches))
+        if not moved:
+            continue
 
+        for note, new_pitch in zip(notes, new_pitches.tolist()):
             note.pitch = new_pitch
-            total_changed += 1
-
-    # Atomic write
-    dir_name = os.path.dirname(midi_path)
-    fd, tmp_path = tempfile.mkstemp(suffix=".mid", dir=dir_name)
-    os.close(fd)
-    try:
-        midi.write(tmp_path)
-        os.replace(tmp_path, midi_path)
-    except Exception:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
-        raise
+        total_moved += moved
+
+    # e.g. every note sat on a scale degree the remap leaves in place
+    if not total_moved:
+        summary = f"No change: every note already fits {dst_name}."
+        logger.info(f"{tag} {summary}")
+        return Unchanged(summary)
+
+    # Atomic write (a caller that passed midi in writes it back itself)
+    if owns_midi:
+        atomic_write_midi(midi, midi_path)
 
     summary = (
         f"Changed from {src_name} to {dst_name}"
@@ -192,5 +281,5 @@ def run_progression_change(tool_call: ToolCall, midi_path: str) -> str:
     if total_clamped:
         summary += f" ({total_clamped} notes clamped to MIDI range 0-127.)"
 
-    print(f"{tag} {summary}")
+    logger.info(f"{tag} {summary}")
     return summary
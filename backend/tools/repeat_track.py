@@ -1,12 +1,18 @@
 # repeat_track — Repeat/loop a track N times.
+import logging
 import os
-import tempfile
 import pretty_midi
 
 from intent.schema import ToolCall
+from tools._atomic import atomic_write_midi, load_midi
+from tools._result import Unchanged
 
+logger = logging.getLogger(__name__)
 
-def run_repeat_track(tool_call: ToolCall, midi_path: str) -> str:
+
+def run_repeat_track(
+    tool_call: ToolCall, midi_path: str, midi: pretty_midi.PrettyMIDI | None = None
+) -> str:
     """Concatenate additional copies of a MIDI file's content.
 
     Reads tool_call.params for:
@@ -14,6 +20,8 @@ def run_repeat_track(tool_call: ToolCall, midi_path: str) -> str:
                      3 copies are added after the original (4 total). Default 1.
 
     Modifies the MIDI file in-place (atomic write) and returns a summary string.
+    If midi is given, edits that already-parsed copy of midi_path instead and
+    leaves writing it back to the caller.
     """
     tag = "[repeat_track]"
 
@@ -25,59 +33,40 @@ def run_repeat_track(tool_call: ToolCall, midi_path: str) -> str:
     if times < 1:
         raise ValueError(f"times must be >= 1, got {times}")
 
-    midi = pretty_midi.PrettyMIDI(midi_path)
+    owns_midi = midi is None
+    if owns_midi:
+        midi = load_midi(midi_path)
 
     original_duration = midi.get_end_time()
     if original_duration <= 0:
-        return "MIDI file is empty, nothing to repeat."
-
-    for inst in midi.instruments:
-        original_notes = list(inst.notes)
-        for copy_idx in range(1, times + 1):
-            offset = copy_idx * original_duration
-            for note in original_notes:
-                inst.notes.append(pretty_midi.Note(
-                    velocity=note.velocity,
-                    pitch=note.pitch,
-                    start=note.start + offset,
-                    end=note.end + offset,
-                ))
+        return Unchanged("MIDI file is empty, nothing to repeat.")
 
-        original_ccs = list(inst.control_changes)
-        for copy_idx in range(1, times + 1):
-            offset = copy_idx * original_duration
-            for cc in original_ccs:
-                inst.control_changes.append(pretty_midi.ControlChange(
-                    number=cc.number,
-                    value=cc.value,
-                    time=cc.time + offset,
-                ))
+    offsets = [copy_idx * original_duration for copy_idx in range(1, times + 1)]
+    Note, ControlChange, PitchBend = pretty_midi.Note, pretty_midi.ControlChange, pretty_midi.PitchBend
 
-        original_bends = list(inst.pitch_bends)
-        for copy_idx in range(1, times + 1):
-            offset = copy_idx * original_duration
-            for pb in original_bends:
-                inst.pitch_bends.append(pretty_midi.PitchBend(
-                    pitch=pb.pitch,
-                    time=pb.time + offset,
-                ))
+    # Build every copy of an event list in one comprehension, then extend once
+    for inst in midi.instruments:
+        inst.notes.extend([
+            Note(note.velocity, note.pitch, note.start + offset, note.end + offset)
+            for offset in offsets for note in inst.notes
+        ])
+        inst.control_changes.extend([
+            ControlChange(cc.number, cc.value, cc.time + offset)
+            for offset in offsets for cc in inst.control_changes
+        ])
+        inst.pitch_bends.extend([
+            PitchBend(pb.pitch, pb.time + offset)
+            for offset in offsets for pb in inst.pitch_bends
+        ])
 
-    # Atomic write
-    dir_name = os.path.dirname(midi_path)
-    fd, tmp_path = tempfile.mkstemp(suffix=".mid", dir=dir_name)
-    os.close(fd)
-    try:
-        midi.write(tmp_path)
-        os.replace(tmp_path, midi_path)
-    except Exception:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
-        raise
+    # Atomic write (a caller that passed midi in writes it back itself)
+    if owns_midi:
+        atomic_write_midi(midi, midi_path)
 
     total = times + 1
     summary = (
         f"Appended {times} additional copy/copies to {os.path.basename(midi_path)} "
         f"({total} total, {original_duration:.1f}s → {original_duration * total:.1f}s)."
     )
-    print(f"{tag} {summary}")
+    logger.info(f"{tag} {summary}")
     return summary
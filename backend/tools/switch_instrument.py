@@ -1,9 +1,15 @@
 # switch_instrument — Change the instrument of a previously created track.
+import logging
 import os
-import tempfile
+from functools import lru_cache
+
 import pretty_midi
 
 from intent.schema import ToolCall
+from tools._atomic import atomic_write_midi, load_midi
+from tools._tracks import find_tracks
+
+logger = logging.getLogger(__name__)
 
 # Canonical instrument name → General MIDI program number.
 # Names here match the canonical forms produced by normalize.py's INSTRUMENT_ALIASES.
@@ -118,31 +124,12 @@ DRUM_NOTE_MAP: dict[str, int] = {
 }
 
 
-def _find_tracks(midi: pretty_midi.PrettyMIDI, description: str) -> list[pretty_midi.Instrument]:
-    """Fuzzy-match a target_description against instrument/track names.
-
-    Unlike pitch_shift/progression_change, switch_instrument needs to match
-    ALL instruments (including drums) since we may switch to or from drums.
-    """
-    all_instruments = list(midi.instruments)
-
-    if not description:
-        return all_instruments
-
-    desc_lower = description.strip().lower()
-    matched = []
-    for inst in midi.instruments:
-        name = (inst.name or "").strip().lower()
-        if name and (name in desc_lower or desc_lower in name):
-            matched.append(inst)
-
-    return matched if matched else all_instruments
-
-
+@lru_cache(maxsize=256)
 def _resolve_program(instrument: str) -> tuple[int, bool]:
     """Resolve an instrument name to (program_number, is_drum).
 
     Returns (-1, True) for drums. Tries exact match first, then substring.
+    Results are memoized, so the substring scan runs once per distinct name.
     """
     name = instrument.strip().lower()
 
@@ -166,7 +153,9 @@ def _resolve_program(instrument: str) -> tuple[int, bool]:
     )
 
 
-def run_switch_instrument(tool_call: ToolCall, midi_path: str) -> str:
+def run_switch_instrument(
+    tool_call: ToolCall, midi_path: str, midi: pretty_midi.PrettyMIDI | None = None
+) -> str:
     """Change the instrument of tracks in a MIDI file.
 
     Reads tool_call.params for:
@@ -174,6 +163,8 @@ def run_switch_instrument(tool_call: ToolCall, midi_path: str) -> str:
         target_description (str, optional): Which track to change.
 
     Modifies the MIDI file in-place (atomic write) and returns a summary string.
+    If midi is given, edits that already-parsed copy of midi_path instead and
+    leaves writing it back to the caller.
     """
     tag = "[switch_instrument]"
 
@@ -188,19 +179,24 @@ def run_switch_instrument(tool_call: ToolCall, midi_path: str) -> str:
 
     program, is_drum = _resolve_program(instrument)
 
-    midi = pretty_midi.PrettyMIDI(midi_path)
+    owns_midi = midi is None
+    if owns_midi:
+        midi = load_midi(midi_path)
 
-    matched = _find_tracks(midi, target)
+    # Unlike pitch_shift/progression_change, drums are candidates too since we
+    # may switch to or from drums
+    matched = find_tracks(midi, target, include_drums=True)
     if not matched:
         available = [inst.name for inst in midi.instruments if inst.name]
         raise ValueError(f"No tracks matching {target!r}. Available: {available}")
 
+    # Specific drum type → remap all notes to that GM percussion note
+    drum_note = DRUM_NOTE_MAP.get(instrument.strip().lower()) if is_drum else None
+
     for inst in matched:
         if is_drum:
             inst.is_drum = True
             inst.name = instrument
-            # Specific drum type → remap all notes to that GM percussion note
-            drum_note = DRUM_NOTE_MAP.get(instrument.strip().lower())
             if drum_note is not None:
                 for note in inst.notes:
                     note.pitch = drum_note
@@ -209,20 +205,11 @@ def run_switch_instrument(tool_call: ToolCall, midi_path: str) -> str:
             inst.program = program
             inst.name = instrument
 
-    # Atomic write
-    dir_name = os.path.dirname(midi_path)
-    fd, tmp_path = tempfile.mkstemp(suffix=".mid", dir=dir_name)
-    os.close(fd)
-    try:
-        midi.write(tmp_path)
-        os.replace(tmp_path, midi_path)
-    except Exception:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
-        raise
+    # Atomic write (a caller that passed midi in writes it back itself)
+    if owns_midi:
+        atomic_write_midi(midi, midi_path)
 
     if is_drum:
-        drum_note = DRUM_NOTE_MAP.get(instrument.strip().lower())
         if drum_note is not None:
             summary = f"Changed {len(matched)} track(s) to {instrument} (drum note {drum_note})."
         else:
@@ -230,5 +217,5 @@ def run_switch_instrument(tool_call: ToolCall, midi_path: str) -> str:
     else:
         summary = f"Changed {len(matched)} track(s) to {instrument} (program {program})."
 
-    print(f"{tag} {summary}")
+    logger.info(f"{tag} {summary}")
     return summary